@@ -9,9 +9,12 @@ from fastapi import Depends, HTTPException, status, Header
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional, Dict, Any
 import hashlib
+import hmac
 import jwt
 from datetime import datetime, timedelta
+import config
 import db
+from cache import TTLCache
 from config import TYPE_HUMAN, TYPE_AI
 
 # JWT 配置
@@ -21,6 +24,13 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24小时
 
 # HTTP Bearer 认证
 security = HTTPBearer()
+# 可选的 Bearer 认证（没有 Authorization 时不报错，由 get_current_user 再尝试 AI 凭证）
+optional_security = HTTPBearer(auto_error=False)
+
+# 最近验证通过的 AI 凭证：client_id -> (secret 哈希, user_id)
+_credential_cache = TTLCache(
+    "ai_credentials", config.CREDENTIAL_CACHE_SIZE, config.CREDENTIAL_CACHE_TTL
+)
 
 
 def hash_secret(secret: str) -> str:
@@ -28,6 +38,11 @@ def hash_secret(secret: str) -> str:
     return hashlib.sha256(secret.encode()).hexdigest()
 
 
+def invalidate_ai_credentials(client_id: str) -> None:
+    """凭证轮换/吊销后使缓存失效"""
+    _credential_cache.invalidate(client_id)
+
+
 def create_access_token(user_id: str, user_type: str, data: Optional[Dict] = None) -> str:
     """创建 JWT 访问令牌"""
     to_encode = {
@@ -84,19 +99,15 @@ async def verify_github_token(
     user_id = payload.get("sub")
     
     # 从数据库验证用户
-    with db.get_db() as conn:
-        user = conn.execute(
-            "SELECT * FROM users WHERE user_id = ? AND type = ?",
-            (user_id, TYPE_HUMAN)
-        ).fetchone()
-        
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found"
-            )
-        
-        return dict(user)
+    user = await db.run_db(db.get_user, user_id)
+    
+    if not user or user.get("type") != TYPE_HUMAN:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+    
+    return user
 
 
 async def verify_ai_credentials(
@@ -109,29 +120,35 @@ async def verify_ai_credentials(
     流程：
     1. 从 header 获取 X-Client-ID 和 X-Client-Secret
     2. 对 secret 进行哈希
-    3. 从数据库验证 client_id 和 client_secret_hash
+    3. 与最近验证通过的凭证比较（常量时间），命中则不查凭证表
+    4. 未命中时从数据库验证 client_id 和 client_secret_hash
     """
     # 对 secret 进行哈希
     secret_hash = hash_secret(client_secret)
     
+    # 最近验证过的凭证
+    cached = _credential_cache.get(client_id)
+    if cached is not None and hmac.compare_digest(cached[0], secret_hash):
+        user = await db.run_db(db.get_user, cached[1])
+        if user:
+            return user
+    
     # 从数据库验证 AI 用户
-    with db.get_db() as conn:
-        user = conn.execute(
-            "SELECT * FROM users WHERE client_id = ? AND client_secret_hash = ? AND type = ?",
-            (client_id, secret_hash, TYPE_AI)
-        ).fetchone()
-        
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid AI credentials"
-            )
-        
-        return dict(user)
+    since = _credential_cache.invalidations
+    user = await db.run_db(db.get_user_by_credentials, client_id, secret_hash)
+    
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid AI credentials"
+        )
+    
+    _credential_cache.set(client_id, (secret_hash, user["user_id"]), since=since)
+    return user
 
 
 async def get_current_user(
-    authorization: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    authorization: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
     client_id: Optional[str] = Header(None, alias="X-Client-ID"),
     client_secret: Optional[str] = Header(None, alias="X-Client-Secret")
 ) -> Dict[str, Any]:
@@ -162,7 +179,7 @@ async def get_current_user(
 
 
 async def get_optional_user(
-    authorization: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    authorization: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
     client_id: Optional[str] = Header(None, alias="X-Client-ID"),
     client_secret: Optional[str] = Header(None, alias="X-Client-Secret")
 ) -> Optional[Dict[str, Any]]:
@@ -193,4 +210,5 @@ def require_role(allowed_roles: list):
 # 预定义权限
 require_admin = require_role(["admin"])
 require_moderator = require_role(["admin", "moderator"])
+require_reviewer = require_role(["admin", "reviewer"])
 require_verified = require_role(["admin", "moderator", "verified"])
@@ -0,0 +1,87 @@
+"""
+jungle-board - 基准测试：GET /api/questions/{id}
+
+对比两种数据库连接方式的吞吐量（requests/sec）：
+- before: 每次调用新建连接（旧版 get_db）
+- after:  连接池复用连接
+
+用法（在 backend 目录下运行）：
+    python benchmarks/bench_question_detail.py [请求数]
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import contextlib
+import io
+from contextlib import contextmanager
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT_DIR = os.path.dirname(BACKEND_DIR)
+
+# 使用临时数据库，避免污染开发数据
+TMP_DIR = tempfile.mkdtemp(prefix="jungle-board-bench-")
+os.environ["JUNGLE_BOARD_DB_PATH"] = os.path.join(TMP_DIR, "bench.db")
+
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "database"))
+
+import init_database_v2  # noqa: E402
+import db  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from server import app  # noqa: E402
+
+
+@contextmanager
+def legacy_get_db():
+    """旧版 get_db：每次调用新建并关闭连接"""
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def run(client: TestClient, path: str, requests: int) -> float:
+    """顺序发送请求，返回 requests/sec"""
+    for _ in range(50):  # 预热
+        client.get(path)
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path)
+        assert response.status_code == 200, response.text
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_database_v2.init_database()
+
+    path = "/api/questions/1"
+    pooled_get_db = db.get_db
+
+    with TestClient(app) as client:
+        db.get_db = legacy_get_db
+        before = run(client, path, requests)
+
+        db.get_db = pooled_get_db
+        after = run(client, path, requests)
+
+    print(f"📊 GET {path} x {requests}")
+    print(f"   before (connect per call): {before:8.1f} req/s")
+    print(f"   after  (connection pool):  {after:8.1f} req/s")
+    print(f"   speedup: {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+jungle-board - 基准测试：列表行的构造与 JSON 序列化
+
+对比两种路径处理 N 行问题数据的每行 CPU 耗时和内存分配：
+- before: sqlite3.Row -> dict -> FastAPI jsonable_encoder -> json.dumps
+- after:  元组 -> models.Question (msgspec Struct) -> msgspec 编码
+
+用法（在 backend 目录下运行）：
+    python benchmarks/bench_row_serialization.py [行数]
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import tempfile
+import tracemalloc
+import contextlib
+import io
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT_DIR = os.path.dirname(BACKEND_DIR)
+
+# 使用临时数据库，避免污染开发数据
+TMP_DIR = tempfile.mkdtemp(prefix="jungle-board-bench-")
+os.environ["JUNGLE_BOARD_DB_PATH"] = os.path.join(TMP_DIR, "bench.db")
+
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "database"))
+
+import init_database_v2  # noqa: E402
+import db  # noqa: E402
+import models  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+SQL = f"SELECT {models.columns(models.Question)} FROM questions ORDER BY id"
+
+
+def legacy_path(conn: sqlite3.Connection) -> bytes:
+    """旧路径：Row -> dict -> jsonable_encoder -> json.dumps"""
+    cursor = conn.execute(SQL)
+    rows = db.rows_to_list(cursor.fetchall())
+    content = jsonable_encoder({"questions": rows, "total": len(rows)})
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def model_path(conn: sqlite3.Connection) -> bytes:
+    """新路径：元组 -> Struct -> msgspec"""
+    rows = db.fetch_models(conn, models.Question, SQL)
+    return models.encode({"questions": rows, "total": len(rows)})
+
+
+def measure(func, conn: sqlite3.Connection, rows: int, rounds: int):
+    """返回 (每行微秒, 每行分配字节峰值)"""
+    func(conn)  # 预热
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(conn)
+    per_row_us = (time.perf_counter() - start) / rounds / rows * 1e6
+
+    tracemalloc.start()
+    func(conn)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return per_row_us, peak / rows
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rounds = 10
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_database_v2.init_database()
+
+    with db.get_db() as conn:
+        conn.execute("DELETE FROM questions")
+        conn.executemany("""
+            INSERT INTO questions (
+                title, type, description, requirements, value_expectation,
+                difficulty, created_by_id, views, votes, heat
+            ) VALUES (?, 'tool', ?, '["a", "b"]', '价值说明', 'medium', 'bench', ?, ?, ?)
+        """, [
+            (f"问题 {i}", "描述" * 20, i % 97, i % 13, i % 97 + i % 13 * 5)
+            for i in range(rows)
+        ])
+
+    with db.get_db() as conn:
+        assert json.loads(legacy_path(conn)) == json.loads(model_path(conn))
+        before_us, before_bytes = measure(legacy_path, conn, rows, rounds)
+        after_us, after_bytes = measure(model_path, conn, rows, rounds)
+
+    print(f"📊 {rows} question rows -> JSON")
+    print(f"   before (dict + jsonable_encoder): {before_us:6.2f} µs/row, {before_bytes:7.0f} B/row peak")
+    print(f"   after  (msgspec Struct):          {after_us:6.2f} µs/row, {after_bytes:7.0f} B/row peak")
+    print(f"   speedup: {before_us / after_us:.2f}x, memory: {before_bytes / after_bytes:.2f}x less")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+jungle-board - 写回缓冲模块
+
+高频计数（如问题浏览次数）和事件（如技能下载）先在内存中累积，
+定时或达到阈值时交给写入线程批量落库，避免每次请求都产生一次磁盘写。
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import config
+import db
+import metrics
+import writer
+
+
+class CounterBuffer:
+    """
+    计数写回缓冲
+
+    pending 是尚未提交的增量，inflight 是已交给写入线程但还没提交完成的增量；
+    两者之和加上数据库中的值就是乐观计数。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        flush_func: Callable[[List[Tuple[int, int]]], None],
+        threshold: int
+    ):
+        self.name = name
+        self.flush_func = flush_func
+        self.threshold = threshold
+        self._pending: Dict[int, int] = {}
+        self._inflight: Dict[int, int] = {}
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def add(self, key: int, amount: int = 1) -> int:
+        """累加增量，返回该 key 尚未落库的增量总数"""
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + amount
+            self._total += amount
+            unflushed = self._pending[key] + self._inflight.get(key, 0)
+            full = self._total >= self.threshold
+        if full:
+            self.flush()
+        return unflushed
+
+    def unflushed(self, key: int) -> int:
+        """该 key 尚未落库的增量"""
+        with self._lock:
+            return self._pending.get(key, 0) + self._inflight.get(key, 0)
+
+    def flush(self) -> Optional[Future]:
+        """把当前累积的增量交给写入线程"""
+        with self._lock:
+            if not self._pending:
+                return None
+            batch, self._pending = self._pending, {}
+            self._total = 0
+            for key, amount in batch.items():
+                self._inflight[key] = self._inflight.get(key, 0) + amount
+
+        metrics.incr(f"{self.name}_flushes")
+        metrics.observe(f"{self.name}_flush_size", len(batch))
+        future = writer.submit_write(self.flush_func, list(batch.items()))
+        future.add_done_callback(lambda f: self._flushed(batch, f))
+        return future
+
+    def _flushed(self, batch: Dict[int, int], future: Future) -> None:
+        failed = future.cancelled() or future.exception() is not None
+        with self._lock:
+            for key, amount in batch.items():
+                left = self._inflight.get(key, 0) - amount
+                if left > 0:
+                    self._inflight[key] = left
+                else:
+                    self._inflight.pop(key, None)
+                if failed:
+                    # 落库失败：放回 pending，下次重试
+                    self._pending[key] = self._pending.get(key, 0) + amount
+                    self._total += amount
+        if failed:
+            metrics.incr(f"{self.name}_flush_errors")
+
+    async def run_periodic(self, interval: float) -> None:
+        """定时落库（后台任务）"""
+        while True:
+            await asyncio.sleep(interval)
+            self.flush()
+
+
+# (skill_id, downloader_id, downloaded_at)
+DownloadEvent = Tuple[int, str, str]
+
+
+class DownloadBuffer:
+    """
+    技能下载事件缓冲（去重 + 批量落库）
+
+    已计数的 (skill_id, downloader_id) 按窗口分两代保存，每个窗口轮换一次：
+    同一用户重复下载在 window 到 2 × window 秒内不再计数，
+    内存中最多只有最近两个窗口的下载者。
+    未落库事件（pending + inflight）达到 max_pending 时丢弃新事件，
+    被丢弃的下载者不记入去重集合，之后重试仍会计数。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        flush_func: Callable[[List[DownloadEvent]], None],
+        threshold: int,
+        window: float,
+        max_pending: int
+    ):
+        self.name = name
+        self.flush_func = flush_func
+        self.threshold = threshold
+        self.window = window
+        self.max_pending = max_pending
+        self._pending: List[DownloadEvent] = []
+        self._pending_since: Optional[float] = None  # 最早一条未提交事件的时间
+        self._inflight = 0
+        self._unflushed: Dict[int, int] = {}  # 每个技能未落库的下载数
+        self._current: Set[Tuple[int, str]] = set()
+        self._previous: Set[Tuple[int, str]] = set()
+        self._window_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _rotate(self, now: float) -> None:
+        elapsed = now - self._window_start
+        if elapsed < self.window:
+            return
+        # 超过两个窗口没有轮换时，当前这一代也已过期
+        self._previous = self._current if elapsed < 2 * self.window else set()
+        self._current = set()
+        self._window_start = now
+
+    def add(self, skill_id: int, downloader_id: str) -> bool:
+        """记录一次下载，返回是否计数（窗口内重复或缓冲已满时为 False）"""
+        now = time.monotonic()
+        key = (skill_id, downloader_id)
+        with self._lock:
+            self._rotate(now)
+            duplicate = key in self._current or key in self._previous
+            dropped = not duplicate and len(self._pending) + self._inflight >= self.max_pending
+            if not duplicate and not dropped:
+                self._current.add(key)
+                self._pending.append((
+                    skill_id, downloader_id,
+                    datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+                ))
+                if self._pending_since is None:
+                    self._pending_since = now
+                self._unflushed[skill_id] = self._unflushed.get(skill_id, 0) + 1
+            full = len(self._pending) >= self.threshold
+
+        if duplicate:
+            metrics.incr(f"{self.name}_deduped")
+            return False
+        if dropped:
+            metrics.incr(f"{self.name}_dropped")
+            return False
+        metrics.incr(f"{self.name}_accepted")
+        if full:
+            self.flush()
+        return True
+
+    def unflushed(self, skill_id: int) -> int:
+        """该技能已计数但尚未落库的下载数"""
+        with self._lock:
+            return self._unflushed.get(skill_id, 0)
+
+    def flush(self) -> Optional[Future]:
+        """把当前累积的事件交给写入线程"""
+        with self._lock:
+            if not self._pending:
+                return None
+            batch, since = self._pending, self._pending_since
+            self._pending, self._pending_since = [], None
+            self._inflight += len(batch)
+
+        metrics.incr(f"{self.name}_flushes")
+        metrics.observe(f"{self.name}_flush_size", len(batch))
+        future = writer.submit_write(self.flush_func, batch)
+        future.add_done_callback(lambda f: self._flushed(batch, since, f))
+        return future
+
+    def _flushed(self, batch: List[DownloadEvent], since: float, future: Future) -> None:
+        failed = future.cancelled() or future.exception() is not None
+        with self._lock:
+            self._inflight -= len(batch)
+            if failed:
+                # 落库失败：放回 pending 队首，下次重试
+                self._pending[:0] = batch
+                self._pending_since = since
+            else:
+                for skill_id, _, _ in batch:
+                    left = self._unflushed.get(skill_id, 0) - 1
+                    if left > 0:
+                        self._unflushed[skill_id] = left
+                    else:
+                        self._unflushed.pop(skill_id, None)
+        if failed:
+            metrics.incr(f"{self.name}_flush_errors")
+            return
+        # 落库延迟：批次中最早的事件从计数到提交经过的时间
+        lag = time.monotonic() - since
+        metrics.set_gauge(f"{self.name}_flush_lag_seconds", lag)
+        metrics.observe(f"{self.name}_flush_lag_seconds", lag)
+
+    async def run_periodic(self, interval: float) -> None:
+        """定时落库（后台任务）"""
+        while True:
+            await asyncio.sleep(interval)
+            self.flush()
+
+
+# 问题浏览次数
+question_views = CounterBuffer(
+    "question_views", db.add_question_views, config.VIEW_FLUSH_THRESHOLD
+)
+
+# 技能下载
+skill_downloads = DownloadBuffer(
+    "skill_downloads", db.add_skill_downloads,
+    config.SKILL_DOWNLOAD_FLUSH_THRESHOLD,
+    config.SKILL_DOWNLOAD_DEDUP_WINDOW,
+    config.SKILL_DOWNLOAD_MAX_PENDING
+)
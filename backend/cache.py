@@ -0,0 +1,91 @@
+"""
+jungle-board - 进程内缓存模块
+
+有界 LRU + TTL 缓存，线程安全，命中/未命中计入 metrics。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+import metrics
+
+_MISSING = object()
+
+
+class TTLCache:
+    """有界 LRU 缓存，条目在 ttl 秒后过期"""
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存（过期视为未命中）"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                value = entry[1]
+            else:
+                if entry is not None:
+                    del self._data[key]
+                value = _MISSING
+
+        if value is _MISSING:
+            metrics.incr(f"cache_{self.name}_misses")
+            return default
+        metrics.incr(f"cache_{self.name}_hits")
+        return value
+
+    @property
+    def invalidations(self) -> int:
+        """失效次数（加载前记录，用于 set 的 since 参数）"""
+        with self._lock:
+            return self._invalidations
+
+    def set(self, key: Hashable, value: Any, since: Optional[int] = None) -> None:
+        """
+        写入缓存，超出容量时淘汰最久未使用的条目
+
+        since 是加载数据前读取的 invalidations；加载期间如果发生过失效，
+        加载到的可能是旧值，不写入缓存。
+        """
+        with self._lock:
+            if since is not None and since != self._invalidations:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """读取缓存，未命中时调用 loader 加载并写入"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            since = self.invalidations
+            value = loader()
+            self.set(key, value, since=since)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        """删除单个条目"""
+        with self._lock:
+            self._data.pop(key, None)
+            self._invalidations += 1
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+            self._invalidations += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
@@ -11,6 +11,79 @@ ACTIVITIES_FILE = "data/activities.json"
 
 # 配置
 MAX_QUESTIONS_PER_DAY = 3  # 每天最多发起 3 个问题
+QUOTA_QUESTIONS_PER_DAY = "questions_per_day"  # 配额名（quota_usage.scope）
+MAX_BATCH_VOTES = 200      # 批量投票单次最多的问题数
+SUBMISSION_BULK_CHUNK = 500  # 批量提交每个事务插入的行数
+
+# 数据库连接池
+DB_POOL_SIZE = 8                    # 连接池最大连接数
+DB_POOL_TIMEOUT = 10.0              # 等待空闲连接的超时（秒）
+DB_BUSY_TIMEOUT_MS = 5000           # 写锁等待时间（毫秒）
+DB_MMAP_SIZE = 256 * 1024 * 1024    # 内存映射大小（字节）
+DB_CACHE_SIZE_KB = 64 * 1024        # 每个连接的页缓存（KB）
+DB_STATEMENT_CACHE_SIZE = 256       # 每个连接缓存的预编译语句数
+DB_MAX_WORKERS = DB_POOL_SIZE       # 执行阻塞查询的线程数（并发上限）
+STREAM_FETCH_SIZE = 200             # 流式响应每次从游标读取的行数
+
+# 列表总数缓存
+COUNT_CACHE_SIZE = 256              # 缓存的 (表, 筛选条件) 组合数
+COUNT_CACHE_TTL = 30.0              # 过期时间（秒），兜底其他进程的写入
+
+# 列表/详情响应缓存（ETag 与服务端响应缓存）
+HTTP_CACHE_SIZE = 512               # 缓存的响应数（按路径 + 查询参数）
+HTTP_CACHE_TTL = 30.0               # 过期时间（秒），兜底其他进程的写入
+
+# 用户缓存
+USER_CACHE_SIZE = 10000             # 最多缓存的用户数
+USER_CACHE_TTL = 60.0               # 过期时间（秒），兜底其他进程的写入
+
+# AI 凭证缓存
+CREDENTIAL_CACHE_SIZE = 10000       # 最多缓存的 AI 客户端数
+CREDENTIAL_CACHE_TTL = 30.0         # 过期时间（秒），其他进程轮换/吊销凭证后最多延迟这么久生效
+
+# 单写入线程（组提交）
+WRITER_MAX_BATCH = 128              # 每次提交最多合并的写操作数
+WRITER_MAX_DELAY = 0.0              # 凑批等待时间（秒），0 表示只合并已排队的写操作
+
+# 浏览次数写回缓冲
+VIEW_FLUSH_INTERVAL = 2.0           # 定时落库间隔（秒）
+VIEW_FLUSH_THRESHOLD = 1000         # 累积多少次浏览后立即落库
+
+# 技能评分（排序分为贝叶斯平均：先验 = 若干个平均分的虚拟评分）
+SKILL_RATING_MIN = 1
+SKILL_RATING_MAX = 5
+SKILL_RATING_PRIOR_MEAN = 3.0       # 先验平均分
+SKILL_RATING_PRIOR_COUNT = 5        # 先验评分数，评分少的技能排序分向先验收缩
+
+# 技能下载缓冲
+SKILL_DOWNLOAD_DEDUP_WINDOW = 3600.0    # 同一用户重复下载同一技能不计数的窗口（秒）
+SKILL_DOWNLOAD_FLUSH_INTERVAL = 2.0     # 定时落库间隔（秒）
+SKILL_DOWNLOAD_FLUSH_THRESHOLD = 500    # 累积多少条下载后立即落库
+SKILL_DOWNLOAD_MAX_PENDING = 50000      # 未落库下载的上限，超出后丢弃新事件（计入指标）
+
+# 智能匹配（docs/ideas/04-smart-matching.md，权重之和为 1）
+MATCH_WEIGHT_TECHNICAL = 0.4        # 技术栈
+MATCH_WEIGHT_DIFFICULTY = 0.2       # 难度
+MATCH_WEIGHT_HISTORY = 0.2          # 历史提交
+MATCH_WEIGHT_DOMAIN = 0.1           # 领域
+MATCH_WEIGHT_SPECIALTY = 0.1        # 专长
+MATCH_REFRESH_INTERVAL = 30.0       # 没有本进程写入时，最多隔多久重新同步问题/活动（秒）
+MATCH_MAX_TERMS_PER_FIELD = 20      # 能力描述每组最多的词数
+MATCH_MAX_TERM_LENGTH = 50          # 能力词最大长度
+MATCH_MAX_VOCABULARY = 5000         # 特征矩阵最多的能力词列数，超出的词每次请求临时计算
+MATCH_CHANGE_OVERLAP = 2            # 按 updated_at 增量同步状态时回看的秒数（覆盖提交晚于时间戳的事务）
+RECOMMENDATION_MAX_LIMIT = 50       # 每次最多返回的推荐数
+
+# 排行榜
+LEADERBOARD_SYNC_INTERVAL = 10.0    # 与 users 表对账的间隔（秒），其他进程的积分变更最多延迟这么久上榜
+
+# 运行指标
+LOOP_LAG_INTERVAL = 0.5             # 事件循环延迟采样间隔（秒）
+
+# 每日活动（docs/game_rules.md：每天 00:01 选出最热的待解决问题）
+DAILY_ACTIVITY_HOUR = 0             # 执行时间（服务器本地时间）
+DAILY_ACTIVITY_MINUTE = 1
+DAILY_ACTIVITY_COUNT = 1            # 每天创建的活动数（热度前 k 个问题）
 
 # 积分规则
 POINTS_REGISTRATION = 100      # 注册奖励
@@ -23,6 +96,26 @@ POINTS_POST_QUESTION_HARD = -100    # 困难问题
 
 POINTS_SUBMIT_SOLUTION = 30     # 提交方案奖励
 
+# 活动名次奖励（docs/game_rules.md，同一用户按最好名次发放一次）
+POINTS_FIRST_PLACE = 100        # 第一名
+POINTS_TOP_THREE = 50           # 第二、三名
+ACTIVITY_PRIZE_RANKS = 3        # 获奖名次
+
+# 积分账本
+POINTS_CHECKPOINT_INTERVAL = 100    # 每个用户每记多少笔账写一次余额检查点
+
+# 操作类型（user_actions.action_type）
+ACTION_REGISTER = "register"
+ACTION_CREATE_QUESTION = "create_question"
+ACTION_SUBMIT = "submit"
+ACTION_ADJUST_SCORE = "adjust_score"
+ACTION_ACTIVITY_PLACE = "activity_place"
+
+# 热度权重（热度 = 浏览数 × 1 + 投票数 × 5 + 参与数 × 10）
+HEAT_WEIGHT_VIEW = 1
+HEAT_WEIGHT_VOTE = 5
+HEAT_WEIGHT_PARTICIPANT = 10
+
 # 活动难度
 DIFFICULTY_EASY = "easy"
 DIFFICULTY_MEDIUM = "medium"
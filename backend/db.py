@@ -3,12 +3,25 @@ jungle-board - 数据库模块
 """
 
 import sqlite3
-from typing import Dict, List, Optional, Any
+import json
+from typing import Dict, List, Optional, Any, Callable, Iterator, Tuple
 from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
 import os
 import sys
+import queue
+import threading
+import time
+from datetime import datetime, timezone
 from pathlib import Path
 
+import config
+import leaderboard
+import models
+from cache import TTLCache
+
 def get_database_path():
     """
     获取数据库路径（跨平台、多环境）
@@ -44,22 +57,263 @@ def get_database_path():
 DB_PATH = str(get_database_path())
 
 
+class ConnectionPool:
+    """
+    SQLite 连接池（有界）
+    
+    连接按需创建，最多 size 个；每个连接只在创建时配置一次
+    （WAL、busy_timeout、mmap、页缓存、语句缓存），之后反复复用。
+    """
+
+    def __init__(self, db_path: str, size: int):
+        self.db_path = db_path
+        self.size = size
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        """创建并配置新连接（不计入池的连接数）"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=config.DB_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=config.DB_STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = sqlite3.Row  # 返回字典格式
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {int(config.DB_BUSY_TIMEOUT_MS)}")
+        conn.execute(f"PRAGMA mmap_size = {int(config.DB_MMAP_SIZE)}")
+        conn.execute(f"PRAGMA cache_size = -{int(config.DB_CACHE_SIZE_KB)}")
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """借出连接（池满时等待空闲连接）"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                return self.connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=config.DB_POOL_TIMEOUT)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Database connection pool exhausted")
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """归还连接"""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close_all(self) -> None:
+        """关闭所有空闲连接（服务关闭时调用）"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+_pool = ConnectionPool(DB_PATH, config.DB_POOL_SIZE)
+_local = threading.local()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
 @contextmanager
 def get_db():
-    """获取数据库连接（上下文管理器）"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # 返回字典格式
-    conn.execute("PRAGMA foreign_keys = ON")
+    """
+    获取数据库连接（上下文管理器）
+    
+    连接从连接池借出；同一线程内的嵌套调用复用同一连接和事务，
+    由最外层负责提交/回滚并归还连接。
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        yield conn
+        return
+
+    conn = _pool.acquire()
+    _local.conn = conn
+    _local.callbacks = []
     try:
         yield conn
         conn.commit()
     except Exception:
         conn.rollback()
         raise
+    finally:
+        callbacks = _local.callbacks
+        _local.conn = None
+        _local.callbacks = None
+        _pool.release(conn)
+
+    for callback in callbacks:
+        callback()
+
+
+def after_commit(callback: Callable[[], None]) -> None:
+    """
+    注册事务提交后的回调（如缓存失效）；事务回滚则不执行
+    
+    不在事务中调用时立即执行。
+    """
+    callbacks = getattr(_local, "callbacks", None)
+    if callbacks is None:
+        callback()
+    else:
+        callbacks.append(callback)
+
+
+@contextmanager
+def savepoint(conn: sqlite3.Connection, name: str = "op"):
+    """
+    事务内的保存点：失败时只回滚该保存点内的修改（及其注册的提交回调），
+    不影响外层事务
+    """
+    callbacks = getattr(_local, "callbacks", None)
+    registered = len(callbacks) if callbacks is not None else 0
+    conn.execute(f"SAVEPOINT {name}")
+    try:
+        yield conn
+    except Exception:
+        conn.execute(f"ROLLBACK TO {name}")
+        conn.execute(f"RELEASE {name}")
+        if callbacks is not None:
+            del callbacks[registered:]
+        raise
+    conn.execute(f"RELEASE {name}")
+
+
+# ==================== 表版本与计数 ====================
+
+_generations: Dict[str, int] = {}
+_modified_at: Dict[str, float] = {}
+_started_at = time.time()
+_generations_lock = threading.Lock()
+_count_cache = TTLCache("counts", config.COUNT_CACHE_SIZE, config.COUNT_CACHE_TTL)
+
+
+def mark_changed(*tables: str) -> None:
+    """标记表已修改：提交后递增表版本号，使相关缓存失效"""
+    def bump():
+        now = time.time()
+        with _generations_lock:
+            for table in tables:
+                _generations[table] = _generations.get(table, 0) + 1
+                _modified_at[table] = now
+    after_commit(bump)
+
+
+def table_generation(table: str) -> int:
+    """表版本号（本进程内每次提交修改后递增）"""
+    with _generations_lock:
+        return _generations.get(table, 0)
+
+
+def table_modified_at(table: str) -> float:
+    """表最后一次提交修改的时间（本进程内没有修改过时为进程启动时间）"""
+    with _generations_lock:
+        return _modified_at.get(table, _started_at)
+
+
+def count_rows(table: str, filters: Optional[Dict[str, Any]] = None) -> int:
+    """
+    按条件统计行数（带缓存）
+    
+    缓存键包含表版本号，表被修改后旧条目自然失效；
+    另有 config.COUNT_CACHE_TTL 兜底其他进程的写入。
+    """
+    filters = {k: v for k, v in (filters or {}).items() if v is not None}
+    key = (table, table_generation(table), tuple(sorted(filters.items())))
+
+    def load() -> int:
+        where, params = build_where(filters)
+        with get_db() as conn:
+            row = conn.execute(
+                f"SELECT COUNT(*) AS count FROM {table} {where}", params
+            ).fetchone()
+            return row["count"]
+
+    return _count_cache.get_or_load(key, load)
+
+
+async def run_db(func: Callable, *args, **kwargs) -> Any:
+    """
+    在数据库线程池中执行阻塞的数据库操作
+    
+    路由处理函数是 async def，直接调用同步查询会阻塞事件循环；
+    线程数由 config.DB_MAX_WORKERS 限制。
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=config.DB_MAX_WORKERS,
+                    thread_name_prefix="jungle-db"
+                )
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+def iter_query(
+    model: type, sql: str, params: Tuple = (), batch_size: int = 0
+) -> Iterator[List]:
+    """
+    分批迭代查询结果（流式响应使用），每批是 model 列表
+    
+    使用单独的只读连接（不占用连接池：慢客户端的流可能持续很久，
+    不能让它们耗尽池中连接、阻塞普通查询和写线程），用 fetchmany
+    每次只取 batch_size 行，内存占用与结果总行数无关；生成器结束或
+    被关闭时关闭连接。不经过 get_db()，各批次可以在不同线程中取出。
+    """
+    batch_size = batch_size or config.STREAM_FETCH_SIZE
+    conn = _pool.connect()
+    conn.execute("PRAGMA query_only = ON")
+    try:
+        cursor = _tuple_cursor(conn)
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield models.from_rows(model, rows)
+        cursor.close()
     finally:
         conn.close()
 
 
+def close_db() -> None:
+    """关闭数据库线程池和连接池中的连接"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+    _pool.close_all()
+
+
 # ==================== 通用数据库操作 ====================
 
 def dict_from_row(row: sqlite3.Row) -> Dict:
@@ -72,26 +326,92 @@ def rows_to_list(rows: List[sqlite3.Row]) -> List[Dict]:
     return [dict(row) for row in rows]
 
 
+def _tuple_cursor(conn: sqlite3.Connection) -> sqlite3.Cursor:
+    """返回元组行的游标（跳过 sqlite3.Row，供模型直接构造）"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor
+
+
+def fetch_models(conn: sqlite3.Connection, model: type, sql: str, params: Tuple = ()) -> List:
+    """执行查询，结果行直接构造为 model 列表（见 models 模块）"""
+    cursor = _tuple_cursor(conn)
+    cursor.execute(sql, params)
+    return models.from_rows(model, cursor.fetchall())
+
+
+# 各列表的排序键（均为降序，与 ORDER BY 和复合索引一致，也是分页游标的内容）
+USER_SORT_KEYS = ("created_at", "id")
+QUESTION_SORT_KEYS = ("heat", "created_at", "id")
+ACTIVITY_SORT_KEYS = ("created_at", "id")
+SKILL_SORT_KEYS = ("rank_score", "downloads", "id")
+USER_ACTION_SORT_KEYS = ("created_at", "id")
+
+
+def build_where(
+    filters: Dict[str, Any],
+    sort_keys: Tuple[str, ...] = (),
+    after: Optional[Tuple] = None
+) -> Tuple[str, List]:
+    """
+    构造 WHERE 子句
+    
+    filters 中值为 None 的条件会被忽略；after 是游标分页的
+    上一页最后一行排序键，生成 (k1, k2, ...) < (?, ?, ...)。
+    """
+    conditions = []
+    params: List[Any] = []
+    for column, value in filters.items():
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if after is not None:
+        placeholders = ", ".join("?" for _ in sort_keys)
+        conditions.append(f"({', '.join(sort_keys)}) < ({placeholders})")
+        params.extend(after)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, params
+
+
 # ==================== Users 表操作 ====================
 
+_user_cache = TTLCache("users", config.USER_CACHE_SIZE, config.USER_CACHE_TTL)
+
+
+def _invalidate_user(user_id: str) -> None:
+    """提交后使用户缓存失效"""
+    after_commit(lambda: _user_cache.invalidate(user_id))
+
+
 def get_user(user_id: str) -> Optional[Dict]:
-    """获取用户信息"""
-    with get_db() as conn:
-        cursor = conn.execute(
-            "SELECT * FROM users WHERE user_id = ?",
-            (user_id,)
-        )
-        return dict_from_row(cursor.fetchone())
+    """
+    获取用户信息（带缓存，返回副本）
+    
+    在事务内调用时直接查库，避免把未提交的数据写进缓存。
+    """
+    def load() -> Dict:
+        with get_db() as conn:
+            cursor = conn.execute(
+                "SELECT * FROM users WHERE user_id = ?",
+                (user_id,)
+            )
+            return dict_from_row(cursor.fetchone())
+
+    if getattr(_local, "conn", None) is not None:
+        return load()
+    return dict(_user_cache.get_or_load(user_id, load))
 
 
 def create_user(user_data: Dict) -> str:
     """创建用户"""
     with get_db() as conn:
+        mark_changed("users")
+        _invalidate_user(user_data.get("user_id"))
         cursor = conn.execute("""
             INSERT INTO users (
                 user_id, username, avatar, type, role,
-                client_id, client_secret_hash, score
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                client_id, client_secret_hash, score, capabilities
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             user_data.get("user_id"),
             user_data.get("username"),
@@ -100,30 +420,94 @@ def create_user(user_data: Dict) -> str:
             user_data.get("role", "user"),
             user_data.get("client_id"),
             user_data.get("client_secret_hash"),
-            user_data.get("score", 0)
+            user_data.get("score", 0),
+            user_data.get("capabilities", "{}")
+        ))
+        # 积分账本起点：之后的余额 = 初始积分 + 账本变动
+        conn.execute(
+            "INSERT INTO points_checkpoints (entity_id, action_id, balance) VALUES (?, 0, ?)",
+            (user_data.get("user_id"), user_data.get("score", 0))
+        )
+        after_commit(lambda: leaderboard.set_user(
+            user_data.get("user_id"), user_data.get("username"),
+            user_data.get("type", "human"), user_data.get("score", 0)
         ))
         return user_data.get("user_id")
 
 
+def register_new_user(user_data: Dict) -> str:
+    """创建用户并发放注册奖励（同一事务）"""
+    with get_db():
+        user_id = create_user(user_data)
+        apply_points(user_id, config.ACTION_REGISTER, config.POINTS_REGISTRATION)
+        return user_id
+
+
 def update_user_score(user_id: str, new_score: int) -> bool:
-    """更新用户积分"""
+    """把用户积分调整为 new_score（差额记入积分账本）"""
     with get_db() as conn:
-        conn.execute(
-            "UPDATE users SET score = ? WHERE user_id = ?",
-            (new_score, user_id)
-        )
+        row = conn.execute(
+            "SELECT score FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return False
+        delta = new_score - (row["score"] or 0)
+        if delta:
+            apply_points(user_id, config.ACTION_ADJUST_SCORE, delta, {"score": new_score})
         return True
 
 
-def list_users(limit: int = 100, offset: int = 0) -> List[Dict]:
-    """列出用户（分页）"""
+def list_user_scores(since: Optional[str] = None) -> List[Dict]:
+    """
+    用户积分（启动时加载排行榜）；指定 since 时只返回 updated_at
+    不早于它的用户（排行榜定时对账，同一秒内的变更会重复返回，合并是幂等的）
+    """
+    sql = "SELECT user_id, username, type, score, updated_at FROM users"
+    params: Tuple = ()
+    if since is not None:
+        sql += " WHERE updated_at >= ?"
+        params = (since,)
+    with get_db() as conn:
+        return rows_to_list(conn.execute(sql, params).fetchall())
+
+
+def get_user_by_credentials(client_id: str, client_secret_hash: str) -> Optional[Dict]:
+    """按 AI 客户端凭证获取用户"""
     with get_db() as conn:
-        cursor = conn.execute("""
-            SELECT * FROM users
-            ORDER BY created_at DESC
+        cursor = conn.execute(
+            "SELECT * FROM users WHERE client_id = ? AND client_secret_hash = ? AND type = ?",
+            (client_id, client_secret_hash, config.TYPE_AI)
+        )
+        return dict_from_row(cursor.fetchone())
+
+
+def update_client_secret(client_id: str, client_secret_hash: Optional[str]) -> bool:
+    """轮换 AI 客户端凭证（client_secret_hash 为 None 表示吊销）"""
+    with get_db() as conn:
+        mark_changed("users")
+        cursor = conn.execute(
+            "UPDATE users SET client_secret_hash = ? WHERE client_id = ? AND type = ?",
+            (client_secret_hash, client_id, config.TYPE_AI)
+        )
+        if cursor.rowcount:
+            _invalidate_user(client_id)
+        return cursor.rowcount > 0
+
+
+def list_users(
+    limit: int = 100,
+    offset: int = 0,
+    after: Optional[Tuple] = None
+) -> List[models.User]:
+    """列出用户（分页；after 为游标分页的 (created_at, id)）"""
+    where, params = build_where({}, USER_SORT_KEYS, after)
+    with get_db() as conn:
+        return fetch_models(conn, models.User, f"""
+            SELECT {models.columns(models.User)} FROM users
+            {where}
+            ORDER BY created_at DESC, id DESC
             LIMIT ? OFFSET ?
-        """, (limit, offset))
-        return rows_to_list(cursor.fetchall())
+        """, (*params, limit, offset))
 
 
 # ==================== Questions 表操作 ====================
@@ -141,6 +525,7 @@ def get_question(question_id: int) -> Optional[Dict]:
 def create_question(question_data: Dict) -> int:
     """创建问题"""
     with get_db() as conn:
+        mark_changed("questions")
         cursor = conn.execute("""
             INSERT INTO questions (
                 title, type, description, requirements,
@@ -158,51 +543,101 @@ def create_question(question_data: Dict) -> int:
             question_data.get("status", "pending"),
             question_data.get("views", 0),
             question_data.get("votes", 0),
-            question_data.get("participants", "[]"),
+            question_data.get("participants", 0),
             question_data.get("heat", 0)
         ))
         return cursor.lastrowid
 
 
+def post_question(question_data: Dict, points: int) -> Optional[Dict]:
+    """
+    发起问题：占用当天配额、创建问题并扣除积分（同一事务）
+    
+    返回 {"question_id", "questions_today"}；当天配额已用完时返回 None。
+    """
+    entity_id = question_data.get("created_by_id")
+    with get_db():
+        used = reserve_quota(
+            entity_id, config.QUOTA_QUESTIONS_PER_DAY, utc_today(),
+            config.MAX_QUESTIONS_PER_DAY
+        )
+        if used is None:
+            return None
+        question_id = create_question(question_data)
+        apply_points(
+            entity_id, config.ACTION_CREATE_QUESTION,
+            points, {"question_id": question_id}
+        )
+        return {"question_id": question_id, "questions_today": used}
+
+
 def list_questions(
     status: Optional[str] = None,
     limit: int = 100,
-    offset: int = 0
-) -> List[Dict]:
-    """列出问题（可按状态筛选）"""
-    with get_db() as conn:
-        if status:
-            cursor = conn.execute("""
-                SELECT * FROM questions
-                WHERE status = ?
-                ORDER BY heat DESC, created_at DESC
-                LIMIT ? OFFSET ?
-            """, (status, limit, offset))
-        else:
-            cursor = conn.execute("""
-                SELECT * FROM questions
-                ORDER BY heat DESC, created_at DESC
-                LIMIT ? OFFSET ?
-            """, (limit, offset))
-        return rows_to_list(cursor.fetchall())
+    offset: int = 0,
+    after: Optional[Tuple] = None
+) -> List[models.Question]:
+    """列出问题（可按状态筛选；after 为游标分页的 (heat, created_at, id)）"""
+    with get_db() as conn:
+        return fetch_models(
+            conn, models.Question, *_questions_query(status, limit, offset, after)
+        )
+
+
+def iter_questions(
+    status: Optional[str] = None,
+    limit: int = 100,
+    offset: int = 0,
+    after: Optional[Tuple] = None
+) -> Iterator[List[models.Question]]:
+    """分批迭代问题列表（参数同 list_questions）"""
+    return iter_query(models.Question, *_questions_query(status, limit, offset, after))
+
+
+def _questions_query(
+    status: Optional[str], limit: int, offset: int, after: Optional[Tuple]
+) -> Tuple[str, Tuple]:
+    where, params = build_where({"status": status}, QUESTION_SORT_KEYS, after)
+    return f"""
+        SELECT {models.columns(models.Question)} FROM questions
+        {where}
+        ORDER BY heat DESC, created_at DESC, id DESC
+        LIMIT ? OFFSET ?
+    """, (*params, limit, offset)
 
 
 def increment_question_views(question_id: int) -> bool:
-    """增加问题浏览次数"""
+    """增加问题浏览次数（同时维护热度）"""
     with get_db() as conn:
+        mark_changed("questions")
         conn.execute(
-            "UPDATE questions SET views = views + 1 WHERE id = ?",
-            (question_id,)
+            "UPDATE questions SET views = views + 1, heat = heat + ? WHERE id = ?",
+            (config.HEAT_WEIGHT_VIEW, question_id)
+        )
+        return True
+
+
+def add_question_views(increments: List[Tuple[int, int]]) -> bool:
+    """批量累加问题浏览次数（[(question_id, 增量), ...]，同时维护热度）"""
+    with get_db() as conn:
+        mark_changed("questions")
+        conn.executemany(
+            "UPDATE questions SET views = views + ?, heat = heat + ? WHERE id = ?",
+            [
+                (amount, amount * config.HEAT_WEIGHT_VIEW, question_id)
+                for question_id, amount in increments
+            ]
         )
         return True
 
 
 def increment_question_votes(question_id: int) -> bool:
-    """增加问题投票数"""
+    """增加问题投票数（同时维护热度）"""
     with get_db() as conn:
+        mark_changed("questions")
         conn.execute(
-            "UPDATE questions SET votes = votes + 1 WHERE id = ?",
-            (question_id,)
+            "UPDATE questions SET votes = votes + 1, heat = heat + ? WHERE id = ?",
+            (config.HEAT_WEIGHT_VOTE, question_id)
         )
         return True
 
@@ -210,6 +645,7 @@ def increment_question_votes(question_id: int) -> bool:
 def update_question_status(question_id: int, status: str) -> bool:
     """更新问题状态"""
     with get_db() as conn:
+        mark_changed("questions")
         conn.execute(
             "UPDATE questions SET status = ? WHERE id = ?",
             (status, question_id)
@@ -218,16 +654,8 @@ def update_question_status(question_id: int, status: str) -> bool:
 
 
 def get_today_question_count(user_id: str) -> int:
-    """获取用户今天发起的问题数量"""
-    with get_db() as conn:
-        cursor = conn.execute("""
-            SELECT COUNT(*) as count
-            FROM questions
-            WHERE created_by_id = ?
-            AND DATE(created_at) = DATE('now')
-        """, (user_id,))
-        row = cursor.fetchone()
-        return row["count"] if row else 0
+    """获取用户今天发起的问题数量（来自配额计数，主键查找）"""
+    return get_quota_usage(user_id, config.QUOTA_QUESTIONS_PER_DAY, utc_today())
 
 
 # ==================== Votes 表操作 ====================
@@ -247,6 +675,7 @@ def has_voted(question_id: int, entity_id: str) -> bool:
 def create_vote(vote_data: Dict) -> int:
     """创建投票"""
     with get_db() as conn:
+        mark_changed("votes")
         cursor = conn.execute("""
             INSERT INTO votes (
                 question_id, entity_id, entity_type, vote
@@ -260,6 +689,63 @@ def create_vote(vote_data: Dict) -> int:
         return cursor.lastrowid
 
 
+def cast_vote(question_id: int, entity_id: str, entity_type: str) -> Optional[Dict]:
+    """
+    为问题投票（单事务）
+    
+    INSERT ... ON CONFLICT DO NOTHING 保证每人每题只有一票；
+    只有真正插入了投票记录才累加投票数和热度。
+    返回 {"recorded", "votes", "heat"}，问题不存在返回 None。
+    """
+    with get_db() as conn:
+        question = conn.execute(
+            "SELECT votes, heat FROM questions WHERE id = ?",
+            (question_id,)
+        ).fetchone()
+        if question is None:
+            return None
+
+        inserted = conn.execute("""
+            INSERT INTO votes (question_id, entity_id, entity_type, vote)
+            VALUES (?, ?, ?, 1)
+            ON CONFLICT (question_id, entity_id) DO NOTHING
+            RETURNING id
+        """, (question_id, entity_id, entity_type)).fetchone()
+        if inserted is None:
+            return {"recorded": False, "votes": question["votes"], "heat": question["heat"]}
+
+        mark_changed("votes", "questions")
+        question = conn.execute("""
+            UPDATE questions SET votes = votes + 1, heat = heat + ?
+            WHERE id = ?
+            RETURNING votes, heat
+        """, (config.HEAT_WEIGHT_VOTE, question_id)).fetchone()
+        return {"recorded": True, "votes": question["votes"], "heat": question["heat"]}
+
+
+def cast_votes(question_ids: List[int], entity_id: str, entity_type: str) -> List[Dict]:
+    """
+    批量投票（单事务）
+    
+    逐个问题调用 cast_vote，返回每个问题的结果：
+    status 为 recorded / already_voted / not_found。
+    """
+    results = []
+    with get_db():
+        for question_id in question_ids:
+            result = cast_vote(question_id, entity_id, entity_type)
+            if result is None:
+                results.append({"question_id": question_id, "status": "not_found"})
+                continue
+            results.append({
+                "question_id": question_id,
+                "status": "recorded" if result["recorded"] else "already_voted",
+                "current_votes": result["votes"],
+                "heat": result["heat"]
+            })
+    return results
+
+
 # ==================== Activities 表操作 ====================
 
 def get_activity(activity_id: int) -> Optional[Dict]:
@@ -275,6 +761,7 @@ def get_activity(activity_id: int) -> Optional[Dict]:
 def create_activity(activity_data: Dict) -> int:
     """创建活动"""
     with get_db() as conn:
+        mark_changed("activities")
         cursor = conn.execute("""
             INSERT INTO activities (
                 question_id, title, type, description,
@@ -292,68 +779,423 @@ def create_activity(activity_data: Dict) -> int:
         return cursor.lastrowid
 
 
+def join_activity(activity_id: int, entity_id: str) -> Optional[Dict]:
+    """
+    加入活动：插入参与记录（已加入时忽略），新加入时同一事务内
+    增加活动参与人数和对应问题的参与数、热度
+    
+    返回 {"joined": 是否新加入, "participants_count"}，活动不存在时返回 None。
+    """
+    with get_db() as conn:
+        activity = conn.execute(
+            "SELECT question_id, participants_count FROM activities WHERE id = ?",
+            (activity_id,)
+        ).fetchone()
+        if activity is None:
+            return None
+
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO participants (activity_id, entity_id) VALUES (?, ?)",
+            (activity_id, entity_id)
+        )
+        if cursor.rowcount == 0:
+            return {"joined": False, "participants_count": activity["participants_count"]}
+
+        mark_changed("participants")
+        mark_changed("activities")
+        mark_changed("questions")
+        row = conn.execute("""
+            UPDATE activities SET participants_count = participants_count + 1
+            WHERE id = ?
+            RETURNING participants_count
+        """, (activity_id,)).fetchone()
+        conn.execute(
+            "UPDATE questions SET participants = participants + 1, heat = heat + ? WHERE id = ?",
+            (config.HEAT_WEIGHT_PARTICIPANT, activity["question_id"])
+        )
+        return {"joined": True, "participants_count": row["participants_count"]}
+
+
+def create_daily_activities(job: str, run_date: str, count: int) -> Optional[List[int]]:
+    """
+    把热度最高的 count 个待解决问题转为活动（单事务），返回新活动 ID
+    
+    先在 scheduled_runs 中以 (job, run_date) 为主键占位：多个进程同时执行时
+    只有一个能插入成功，其余直接返回 None。占位、创建活动和记录耗时在同一事务中，
+    失败回滚后占位也随之撤销，可以重试。
+    候选问题走 (status, heat, created_at, id) 复合索引，只读取前 count 行。
+    """
+    start = time.perf_counter()
+    with get_db() as conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO scheduled_runs (job, run_date) VALUES (?, ?)",
+            (job, run_date)
+        )
+        if cursor.rowcount == 0:
+            return None
+
+        questions = conn.execute("""
+            SELECT id, title, type, description, requirements, difficulty
+            FROM questions
+            WHERE status = ?
+            ORDER BY heat DESC, created_at DESC, id DESC
+            LIMIT ?
+        """, (config.STATUS_PENDING, count)).fetchall()
+
+        activity_ids = []
+        for question in questions:
+            activity_ids.append(create_activity({
+                "question_id": question["id"],
+                "title": question["title"],
+                "type": question["type"],
+                "description": question["description"],
+                "requirements": question["requirements"],
+                "difficulty": question["difficulty"]
+            }))
+            update_question_status(question["id"], config.STATUS_ACTIVE)
+
+        conn.execute("""
+            UPDATE scheduled_runs
+            SET finished_at = CURRENT_TIMESTAMP, duration_ms = ?, result = ?
+            WHERE job = ? AND run_date = ?
+        """, (
+            (time.perf_counter() - start) * 1000,
+            json.dumps({"activity_ids": activity_ids}),
+            job,
+            run_date
+        ))
+        return activity_ids
+
+
 def list_activities(
     status: Optional[str] = None,
     limit: int = 100,
-    offset: int = 0
-) -> List[Dict]:
-    """列出活动（可按状态筛选）"""
-    with get_db() as conn:
-        if status:
-            cursor = conn.execute("""
-                SELECT * FROM activities
-                WHERE status = ?
-                ORDER BY created_at DESC
-                LIMIT ? OFFSET ?
-            """, (status, limit, offset))
-        else:
-            cursor = conn.execute("""
-                SELECT * FROM activities
-                ORDER BY created_at DESC
-                LIMIT ? OFFSET ?
-            """, (limit, offset))
-        return rows_to_list(cursor.fetchall())
+    offset: int = 0,
+    after: Optional[Tuple] = None
+) -> List[models.Activity]:
+    """列出活动（可按状态筛选；after 为游标分页的 (created_at, id)）"""
+    where, params = build_where({"status": status}, ACTIVITY_SORT_KEYS, after)
+    with get_db() as conn:
+        return fetch_models(conn, models.Activity, f"""
+            SELECT {models.columns(models.Activity)} FROM activities
+            {where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ? OFFSET ?
+        """, (*params, limit, offset))
 
 
-def update_activity_status(activity_id: int, status: str) -> bool:
-    """更新活动状态"""
+def update_activity_status(activity_id: int, status: str) -> Optional[bool]:
+    """
+    更新活动状态（不能用于结束活动，见 close_activity）
+    
+    已结束的活动不能重新打开（名次奖励已发放）：状态检查和更新在同一条
+    UPDATE 中完成，与并发的结束操作不会交错。活动已结束时返回 False，
+    活动不存在时返回 None。
+    """
     with get_db() as conn:
-        conn.execute(
-            "UPDATE activities SET status = ? WHERE id = ?",
-            (status, activity_id)
+        cursor = conn.execute(
+            "UPDATE activities SET status = ? WHERE id = ? AND status != ?",
+            (status, activity_id, config.STATUS_CLOSED)
         )
-        return True
+        if cursor.rowcount:
+            mark_changed("activities")
+            return True
+        exists = conn.execute(
+            "SELECT 1 FROM activities WHERE id = ?", (activity_id,)
+        ).fetchone()
+        return False if exists else None
 
 
 # ==================== Submissions 表操作 ====================
 
-def get_submissions(activity_id: int) -> List[Dict]:
+_SUBMISSIONS_SQL = f"""
+    SELECT {models.columns(models.Submission)} FROM submissions
+    WHERE activity_id = ?
+    ORDER BY submitted_at DESC
+"""
+
+# 新提交 0 票，名次 = 1 + 同活动中有票的提交数（参数：activity_id）
+_NEW_SUBMISSION_RANK = "SELECT COUNT(*) + 1 FROM submissions WHERE activity_id = ? AND vote_count > 0"
+
+
+def get_submissions(activity_id: int) -> List[models.Submission]:
     """获取活动的所有提交"""
     with get_db() as conn:
-        cursor = conn.execute("""
-            SELECT * FROM submissions
-            WHERE activity_id = ?
-            ORDER BY submitted_at DESC
-        """, (activity_id,))
-        return rows_to_list(cursor.fetchall())
+        return fetch_models(conn, models.Submission, _SUBMISSIONS_SQL, (activity_id,))
+
+
+def iter_submissions(activity_id: int) -> Iterator[List[models.Submission]]:
+    """分批迭代活动的所有提交（提交内容可能很大，导出时使用）"""
+    return iter_query(models.Submission, _SUBMISSIONS_SQL, (activity_id,))
 
 
 def create_submission(submission_data: Dict) -> int:
-    """创建提交"""
+    """创建提交（该用户在该活动的首次提交同时发放提交奖励）"""
+    activity_id = submission_data.get("activity_id")
+    submitter_id = submission_data.get("submitter_id")
     with get_db() as conn:
-        cursor = conn.execute("""
+        mark_changed("submissions")
+        first = not _has_submitted(conn, activity_id, submitter_id)
+        cursor = conn.execute(f"""
             INSERT INTO submissions (
-                activity_id, submitter_id, submitter_name, content
-            ) VALUES (?, ?, ?, ?)
+                activity_id, submitter_id, submitter_name, content, rank
+            ) VALUES (?, ?, ?, ?, ({_NEW_SUBMISSION_RANK}))
         """, (
-            submission_data.get("activity_id"),
-            submission_data.get("submitter_id"),
+            activity_id,
+            submitter_id,
             submission_data.get("submitter_name"),
-            submission_data.get("content")
+            submission_data.get("content"),
+            activity_id
         ))
+        if first:
+            _award_submission(submitter_id, activity_id, cursor.lastrowid)
         return cursor.lastrowid
 
 
+def _has_submitted(conn: sqlite3.Connection, activity_id: int, submitter_id: str) -> bool:
+    """是否已提交过（走 (activity_id, submitter_id) 索引，不扫描提交表）"""
+    return conn.execute(
+        "SELECT 1 FROM submissions WHERE activity_id = ? AND submitter_id = ? LIMIT 1",
+        (activity_id, submitter_id)
+    ).fetchone() is not None
+
+
+def _award_submission(submitter_id: str, activity_id: int, submission_id: int) -> None:
+    """首次提交奖励"""
+    apply_points(
+        submitter_id, config.ACTION_SUBMIT, config.POINTS_SUBMIT_SOLUTION,
+        {"activity_id": activity_id, "submission_id": submission_id}
+    )
+
+
+def create_submissions(submissions: List[Dict]) -> List[int]:
+    """
+    批量创建提交（executemany，单事务）
+    
+    返回按输入顺序排列的提交 ID：AUTOINCREMENT 在同一个写事务中
+    分配连续的 ID，由最后一个 ID 倒推。每个 (活动, 用户) 的首次提交发放提交奖励。
+    """
+    if not submissions:
+        return []
+    with get_db() as conn:
+        mark_changed("submissions")
+        pairs = {(s.get("activity_id"), s.get("submitter_id")) for s in submissions}
+        first = {pair for pair in pairs if not _has_submitted(conn, *pair)}
+        conn.executemany(f"""
+            INSERT INTO submissions (
+                activity_id, submitter_id, submitter_name, content, rank
+            ) VALUES (?, ?, ?, ?, ({_NEW_SUBMISSION_RANK}))
+        """, [
+            (
+                submission.get("activity_id"),
+                submission.get("submitter_id"),
+                submission.get("submitter_name"),
+                submission.get("content"),
+                submission.get("activity_id")
+            )
+            for submission in submissions
+        ])
+        last_id = conn.execute("SELECT last_insert_rowid() AS id").fetchone()["id"]
+        ids = list(range(last_id - len(submissions) + 1, last_id + 1))
+        for submission, submission_id in zip(submissions, ids):
+            pair = (submission.get("activity_id"), submission.get("submitter_id"))
+            if pair in first:
+                first.discard(pair)
+                _award_submission(pair[1], pair[0], submission_id)
+        return ids
+
+
+# ==================== 提交投票与排名 ====================
+
+# 排名列表的排序：票数降序，同票先提交的在前（与 idx_submissions_activity_votes 一致）
+RANKING_SORT_KEYS = ("vote_count", "id")
+
+
+def _submission_for_vote(conn: sqlite3.Connection, activity_id: int, submission_id: int):
+    return conn.execute("""
+        SELECT s.id, s.activity_id, s.submitter_id, s.vote_count, s.rank, a.status
+        FROM submissions s JOIN activities a ON a.id = s.activity_id
+        WHERE s.id = ? AND s.activity_id = ?
+    """, (submission_id, activity_id)).fetchone()
+
+
+def _rerank(conn: sqlite3.Connection, submission: sqlite3.Row, delta: int) -> Dict:
+    """
+    票数 ±1 后增量更新名次（并列排名：名次 = 1 + 同活动中票数更高的提交数）
+    
+    只有原票数和目标票数两组并列的提交会受影响，
+    两组都由 (activity_id, vote_count) 索引直接定位，不重新统计整个活动。
+    """
+    activity_id, votes = submission["activity_id"], submission["vote_count"]
+    if delta > 0:
+        # 原来与它并列的提交现在多了一个票数更高者
+        conn.execute("""
+            UPDATE submissions SET rank = rank + 1
+            WHERE activity_id = ? AND vote_count = ? AND id != ?
+        """, (activity_id, votes, submission["id"]))
+        # 并入票数 +1 的并列组，名次与该组相同
+        ties = conn.execute(
+            "SELECT COUNT(*) FROM submissions WHERE activity_id = ? AND vote_count = ?",
+            (activity_id, votes + 1)
+        ).fetchone()[0]
+        rank = submission["rank"] - ties
+    else:
+        # 票数 -1 的提交不再排在它后面
+        conn.execute("""
+            UPDATE submissions SET rank = rank - 1
+            WHERE activity_id = ? AND vote_count = ?
+        """, (activity_id, votes - 1))
+        # 原来并列的提交现在都排在它前面
+        ties = conn.execute("""
+            SELECT COUNT(*) FROM submissions
+            WHERE activity_id = ? AND vote_count = ? AND id != ?
+        """, (activity_id, votes, submission["id"])).fetchone()[0]
+        rank = submission["rank"] + ties
+
+    row = conn.execute("""
+        UPDATE submissions SET vote_count = vote_count + ?, rank = ?
+        WHERE id = ?
+        RETURNING vote_count, rank
+    """, (delta, rank, submission["id"])).fetchone()
+    mark_changed("submissions")
+    return {"vote_count": row["vote_count"], "rank": row["rank"]}
+
+
+def vote_submission(
+    activity_id: int, submission_id: int, entity_id: str, entity_type: str
+) -> Optional[Dict]:
+    """
+    为提交投票（单事务，每人每个提交一票）
+    
+    返回 {"status", "vote_count", "rank"}，status 为 recorded / already_voted /
+    own_submission / closed；提交不存在或不属于该活动时返回 None。
+    """
+    with get_db() as conn:
+        submission = _submission_for_vote(conn, activity_id, submission_id)
+        if submission is None:
+            return None
+        result = {"vote_count": submission["vote_count"], "rank": submission["rank"]}
+        if submission["status"] == config.STATUS_CLOSED:
+            return {"status": "closed", **result}
+        if submission["submitter_id"] == entity_id:
+            return {"status": "own_submission", **result}
+
+        inserted = conn.execute("""
+            INSERT INTO submission_votes (submission_id, entity_id, entity_type, vote)
+            VALUES (?, ?, ?, 1)
+            ON CONFLICT (submission_id, entity_id) DO NOTHING
+            RETURNING id
+        """, (submission_id, entity_id, entity_type)).fetchone()
+        if inserted is None:
+            return {"status": "already_voted", **result}
+
+        mark_changed("submission_votes")
+        return {"status": "recorded", **_rerank(conn, submission, 1)}
+
+
+def unvote_submission(activity_id: int, submission_id: int, entity_id: str) -> Optional[Dict]:
+    """
+    撤回对提交的投票（单事务）
+    
+    返回 {"status", "vote_count", "rank"}，status 为 removed / not_voted / closed；
+    提交不存在或不属于该活动时返回 None。
+    """
+    with get_db() as conn:
+        submission = _submission_for_vote(conn, activity_id, submission_id)
+        if submission is None:
+            return None
+        result = {"vote_count": submission["vote_count"], "rank": submission["rank"]}
+        if submission["status"] == config.STATUS_CLOSED:
+            return {"status": "closed", **result}
+
+        deleted = conn.execute(
+            "DELETE FROM submission_votes WHERE submission_id = ? AND entity_id = ? RETURNING id",
+            (submission_id, entity_id)
+        ).fetchone()
+        if deleted is None:
+            return {"status": "not_voted", **result}
+
+        mark_changed("submission_votes")
+        return {"status": "removed", **_rerank(conn, submission, -1)}
+
+
+def get_submission_ranking(
+    activity_id: int, limit: int = 50, after: Optional[Tuple] = None
+) -> List[models.RankedSubmission]:
+    """活动的提交排名（走 (activity_id, vote_count, id) 索引；after 为游标分页的 (vote_count, id)）"""
+    where, params = "activity_id = ?", [activity_id]
+    if after is not None:
+        where += " AND (vote_count < ? OR (vote_count = ? AND id > ?))"
+        params += [after[0], after[0], after[1]]
+    with get_db() as conn:
+        return fetch_models(conn, models.RankedSubmission, f"""
+            SELECT {models.columns(models.RankedSubmission)} FROM submissions
+            WHERE {where}
+            ORDER BY vote_count DESC, id
+            LIMIT ?
+        """, (*params, limit))
+
+
+def close_activity(activity_id: int) -> Optional[Dict]:
+    """
+    结束活动并评出名次（单事务，只执行一次）
+    
+    名次已由投票增量维护，这里只读取前 ACTIVITY_PRIZE_RANKS 名（按票数索引取，
+    名次 ≤ N 等价于票数不低于第 N 高的票数）：第一名标记 winner，
+    每个获奖用户按最好名次发放一次奖励。没有票的提交不参与评奖。
+    返回 {"closed": 本次是否关闭, "winners": [...], "placed": [...]}，活动不存在时返回 None。
+    """
+    with get_db() as conn:
+        activity = conn.execute(
+            "SELECT status FROM activities WHERE id = ?", (activity_id,)
+        ).fetchone()
+        if activity is None:
+            return None
+        if activity["status"] == config.STATUS_CLOSED:
+            return {"closed": False, "winners": [], "placed": []}
+
+        conn.execute(
+            "UPDATE activities SET status = ? WHERE id = ?",
+            (config.STATUS_CLOSED, activity_id)
+        )
+        placed = conn.execute("""
+            SELECT id, submitter_id, rank FROM submissions
+            WHERE activity_id = ? AND vote_count > 0 AND vote_count >= COALESCE((
+                SELECT vote_count FROM submissions WHERE activity_id = ?
+                ORDER BY vote_count DESC LIMIT 1 OFFSET ?
+            ), 0)
+            ORDER BY vote_count DESC, id
+        """, (activity_id, activity_id, config.ACTIVITY_PRIZE_RANKS - 1)).fetchall()
+
+        winners = [row["id"] for row in placed if row["rank"] == 1]
+        conn.executemany(
+            "UPDATE submissions SET winner = 1 WHERE id = ?",
+            [(submission_id,) for submission_id in winners]
+        )
+
+        best: Dict[str, sqlite3.Row] = {}
+        for row in placed:
+            if row["submitter_id"] not in best:
+                best[row["submitter_id"]] = row
+        for submitter_id, row in best.items():
+            points = config.POINTS_FIRST_PLACE if row["rank"] == 1 else config.POINTS_TOP_THREE
+            apply_points(
+                submitter_id, config.ACTION_ACTIVITY_PLACE, points,
+                {"activity_id": activity_id, "submission_id": row["id"], "rank": row["rank"]}
+            )
+
+        mark_changed("activities")
+        mark_changed("submissions")
+        return {
+            "closed": True,
+            "winners": winners,
+            "placed": [
+                {"submission_id": row["id"], "submitter_id": row["submitter_id"], "rank": row["rank"]}
+                for row in placed
+            ]
+        }
+
+
 # ==================== Skills 表操作 ====================
 
 def get_skill(skill_id: int) -> Optional[Dict]:
@@ -367,20 +1209,22 @@ def get_skill(skill_id: int) -> Optional[Dict]:
 
 
 def create_skill(skill_data: Dict) -> int:
-    """创建技能"""
+    """创建技能（还没有评分，排序分取先验平均分）"""
     with get_db() as conn:
+        mark_changed("skills")
         cursor = conn.execute("""
             INSERT INTO skills (
                 name, category, description, value_level,
-                author_id, author_name
-            ) VALUES (?, ?, ?, ?, ?, ?)
+                author_id, author_name, rank_score
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
         """, (
             skill_data.get("name"),
             skill_data.get("category"),
             skill_data.get("description"),
             skill_data.get("value_level"),
             skill_data.get("author_id"),
-            skill_data.get("author_name")
+            skill_data.get("author_name"),
+            config.SKILL_RATING_PRIOR_MEAN
         ))
         return cursor.lastrowid
 
@@ -388,24 +1232,108 @@ def create_skill(skill_data: Dict) -> int:
 def list_skills(
     category: Optional[str] = None,
     limit: int = 100,
-    offset: int = 0
-) -> List[Dict]:
-    """列出技能（可按分类筛选）"""
-    with get_db() as conn:
-        if category:
-            cursor = conn.execute("""
-                SELECT * FROM skills
-                WHERE category = ?
-                ORDER BY rating DESC, downloads DESC
-                LIMIT ? OFFSET ?
-            """, (category, limit, offset))
-        else:
-            cursor = conn.execute("""
-                SELECT * FROM skills
-                ORDER BY rating DESC, downloads DESC
-                LIMIT ? OFFSET ?
-            """, (limit, offset))
-        return rows_to_list(cursor.fetchall())
+    offset: int = 0,
+    after: Optional[Tuple] = None
+) -> List[models.Skill]:
+    """列出技能（按排序分，可按分类筛选；after 为游标分页的 (rank_score, downloads, id)）"""
+    with get_db() as conn:
+        return fetch_models(
+            conn, models.Skill, *_skills_query(category, limit, offset, after)
+        )
+
+
+def iter_skills(
+    category: Optional[str] = None,
+    limit: int = 100,
+    offset: int = 0,
+    after: Optional[Tuple] = None
+) -> Iterator[List[models.Skill]]:
+    """分批迭代技能列表（参数同 list_skills）"""
+    return iter_query(models.Skill, *_skills_query(category, limit, offset, after))
+
+
+def _skills_query(
+    category: Optional[str], limit: int, offset: int, after: Optional[Tuple]
+) -> Tuple[str, Tuple]:
+    where, params = build_where({"category": category}, SKILL_SORT_KEYS, after)
+    return f"""
+        SELECT {models.columns(models.Skill)} FROM skills
+        {where}
+        ORDER BY rank_score DESC, downloads DESC, id DESC
+        LIMIT ? OFFSET ?
+    """, (*params, limit, offset)
+
+
+def record_skill_rating(
+    skill_id: int, rater_id: str, rating: int, comment: Optional[str] = None
+) -> Optional[Dict]:
+    """
+    记录评分，并在同一事务内增量更新技能的平均分、评分数和排序分
+    
+    同一用户再次评分时替换原评分（评分数不变）。不重新统计全部评分：
+    新平均分 = (旧平均分 × 旧评分数 + 分差) / 新评分数。
+    返回更新后的 rating / rating_count / rank_score，技能不存在时返回 None。
+    """
+    with get_db() as conn:
+        old = conn.execute(
+            "SELECT rating FROM skill_ratings WHERE skill_id = ? AND rater_id = ?",
+            (skill_id, rater_id)
+        ).fetchone()
+        added = 0 if old else 1
+        delta = rating - (old["rating"] if old else 0)
+
+        # SET 中引用的列都是更新前的值
+        row = conn.execute("""
+            UPDATE skills SET
+                rating = (rating * rating_count + ?) / (rating_count + ?),
+                rating_count = rating_count + ?,
+                rank_score = (? * ? + rating * rating_count + ?) / (? + rating_count + ?)
+            WHERE id = ?
+            RETURNING rating, rating_count, rank_score
+        """, (
+            delta, added,
+            added,
+            config.SKILL_RATING_PRIOR_MEAN, config.SKILL_RATING_PRIOR_COUNT, delta,
+            config.SKILL_RATING_PRIOR_COUNT, added,
+            skill_id
+        )).fetchone()
+        if row is None:
+            return None
+
+        conn.execute("""
+            INSERT INTO skill_ratings (skill_id, rater_id, rating, comment)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(skill_id, rater_id) DO UPDATE SET
+                rating = excluded.rating,
+                comment = excluded.comment,
+                rated_at = CURRENT_TIMESTAMP
+        """, (skill_id, rater_id, rating, comment))
+        mark_changed("skills")
+        mark_changed("skill_ratings")
+        return dict(row)
+
+
+def add_skill_downloads(events: List[Tuple[int, str, str]]) -> bool:
+    """
+    批量写入下载记录（[(skill_id, downloader_id, downloaded_at), ...]）
+    
+    同一事务内按技能合并后累加 skills.downloads，每个技能一条 UPDATE。
+    """
+    counts: Dict[int, int] = {}
+    for skill_id, _, _ in events:
+        counts[skill_id] = counts.get(skill_id, 0) + 1
+    with get_db() as conn:
+        mark_changed("skills")
+        mark_changed("skill_downloads")
+        conn.executemany(
+            "INSERT INTO skill_downloads (skill_id, downloader_id, downloaded_at) VALUES (?, ?, ?)",
+            events
+        )
+        conn.executemany(
+            "UPDATE skills SET downloads = downloads + ? WHERE id = ?",
+            [(amount, skill_id) for skill_id, amount in counts.items()]
+        )
+        return True
 
 
 # ==================== User Actions 表操作 ====================
@@ -413,6 +1341,7 @@ def list_skills(
 def create_user_action(action_data: Dict) -> int:
     """创建用户操作日志"""
     with get_db() as conn:
+        mark_changed("user_actions")
         cursor = conn.execute("""
             INSERT INTO user_actions (
                 entity_id, entity_type, action_type,
@@ -432,22 +1361,327 @@ def create_user_action(action_data: Dict) -> int:
 def get_user_actions(
     entity_id: str,
     action_type: Optional[str] = None,
-    limit: int = 100
+    limit: int = 100,
+    after: Optional[Tuple] = None
 ) -> List[Dict]:
-    """获取用户操作日志"""
-    with get_db() as conn:
-        if action_type:
-            cursor = conn.execute("""
-                SELECT * FROM user_actions
-                WHERE entity_id = ? AND action_type = ?
-                ORDER BY created_at DESC
-                LIMIT ?
-            """, (entity_id, action_type, limit))
-        else:
-            cursor = conn.execute("""
-                SELECT * FROM user_actions
-                WHERE entity_id = ?
-                ORDER BY created_at DESC
-                LIMIT ?
-            """, (entity_id, limit))
+    """获取用户操作日志（after 为游标分页的 (created_at, id)）"""
+    where, params = build_where(
+        {"entity_id": entity_id, "action_type": action_type},
+        USER_ACTION_SORT_KEYS,
+        after
+    )
+    with get_db() as conn:
+        cursor = conn.execute(f"""
+            SELECT * FROM user_actions
+            {where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """, (*params, limit))
         return rows_to_list(cursor.fetchall())
+
+
+# ==================== 积分账本 ====================
+
+def apply_points(
+    entity_id: str,
+    action_type: str,
+    points: int,
+    metadata: Optional[Dict] = None
+) -> Optional[int]:
+    """
+    记一笔积分变动：同一事务中调整 users.score 并写入 user_actions
+    
+    余额用 score = score + ? 原子累加（不读后写），返回变动后的余额；
+    用户不存在时返回 None。每记 config.POINTS_CHECKPOINT_INTERVAL 笔
+    写一次余额检查点，核对余额时只需累加检查点之后的记录。
+    """
+    with get_db() as conn:
+        row = conn.execute("""
+            UPDATE users SET score = COALESCE(score, 0) + ?
+            WHERE user_id = ?
+            RETURNING score, type
+        """, (points, entity_id)).fetchone()
+        if row is None:
+            return None
+        balance = row["score"]
+
+        mark_changed("users", "user_actions")
+        _invalidate_user(entity_id)
+        cursor = conn.execute("""
+            INSERT INTO user_actions (
+                entity_id, entity_type, action_type,
+                metadata, points_change, points_after
+            ) VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            entity_id,
+            row["type"],
+            action_type,
+            json.dumps(metadata or {}, ensure_ascii=False),
+            points,
+            balance
+        ))
+        _maybe_checkpoint(conn, entity_id, cursor.lastrowid, balance)
+        after_commit(lambda: leaderboard.update_score(entity_id, balance))
+        return balance
+
+
+def _latest_checkpoint(conn: sqlite3.Connection, entity_id: str) -> Optional[sqlite3.Row]:
+    return conn.execute("""
+        SELECT action_id, balance, created_at FROM points_checkpoints
+        WHERE entity_id = ?
+        ORDER BY action_id DESC
+        LIMIT 1
+    """, (entity_id,)).fetchone()
+
+
+def _maybe_checkpoint(
+    conn: sqlite3.Connection, entity_id: str, action_id: int, balance: int
+) -> None:
+    """距上个检查点已满 config.POINTS_CHECKPOINT_INTERVAL 笔时写入新检查点"""
+    checkpoint = _latest_checkpoint(conn, entity_id)
+    since = checkpoint["action_id"] if checkpoint else 0
+    # 最多数到 INTERVAL 行（(entity_id, id) 索引上的范围扫描）
+    row = conn.execute("""
+        SELECT COUNT(*) AS count FROM (
+            SELECT 1 FROM user_actions
+            WHERE entity_id = ? AND id > ?
+            LIMIT ?
+        )
+    """, (entity_id, since, config.POINTS_CHECKPOINT_INTERVAL)).fetchone()
+    if row["count"] >= config.POINTS_CHECKPOINT_INTERVAL:
+        conn.execute(
+            "INSERT INTO points_checkpoints (entity_id, action_id, balance) VALUES (?, ?, ?)",
+            (entity_id, action_id, balance)
+        )
+
+
+def _ledger_balance(conn: sqlite3.Connection, entity_id: str) -> Tuple[int, int]:
+    """由最近检查点 + 其后的账本记录算出余额，返回 (余额, 最后一笔记录 ID)"""
+    checkpoint = _latest_checkpoint(conn, entity_id)
+    base = checkpoint["balance"] if checkpoint else 0
+    since = checkpoint["action_id"] if checkpoint else 0
+    row = conn.execute("""
+        SELECT COALESCE(SUM(points_change), 0) AS delta, MAX(id) AS last_id
+        FROM user_actions
+        WHERE entity_id = ? AND id > ?
+    """, (entity_id, since)).fetchone()
+    return base + row["delta"], row["last_id"] or since
+
+
+def verify_points_balance(entity_id: str) -> Optional[Dict]:
+    """核对用户余额与积分账本是否一致；用户不存在时返回 None"""
+    with get_db() as conn:
+        user = conn.execute(
+            "SELECT score FROM users WHERE user_id = ?", (entity_id,)
+        ).fetchone()
+        if user is None:
+            return None
+        checkpoint = _latest_checkpoint(conn, entity_id)
+        balance, _ = _ledger_balance(conn, entity_id)
+        score = user["score"] or 0
+        return {
+            "user_id": entity_id,
+            "score": score,
+            "ledger_balance": balance,
+            "consistent": score == balance,
+            "checkpoint": dict(checkpoint) if checkpoint else None
+        }
+
+
+def rebuild_points_balance(entity_id: str) -> Optional[int]:
+    """按积分账本重建用户余额并写入新检查点；用户不存在时返回 None"""
+    with get_db() as conn:
+        balance, last_id = _ledger_balance(conn, entity_id)
+        cursor = conn.execute(
+            "UPDATE users SET score = ? WHERE user_id = ?", (balance, entity_id)
+        )
+        if cursor.rowcount == 0:
+            return None
+        mark_changed("users")
+        _invalidate_user(entity_id)
+        conn.execute("""
+            INSERT OR REPLACE INTO points_checkpoints (entity_id, action_id, balance)
+            VALUES (?, ?, ?)
+        """, (entity_id, last_id, balance))
+        after_commit(lambda: leaderboard.update_score(entity_id, balance))
+        return balance
+
+
+# ==================== 全文搜索 ====================
+
+# 类型 -> (内容表, FTS 表, 标题列, 筛选列)，FTS 表由 database/init_database_v2.py 创建
+SEARCH_SOURCES = {
+    "question": ("questions", "questions_fts", "title", "status"),
+    "activity": ("activities", "activities_fts", "title", "status"),
+    "skill": ("skills", "skills_fts", "name", "category"),
+}
+# 搜索结果排序键（升序：bm25 越小越相关）
+SEARCH_SORT_KEYS = ("rank", "type", "id")
+SEARCH_MIN_TERM_LENGTH = 3  # trigram 分词的最短检索词
+
+
+def fts_query(text: str) -> Optional[str]:
+    """
+    把用户输入转为 FTS5 查询：按空白切词，每个词加引号按字面匹配，词之间为 AND
+    
+    没有检索词或有词短于 SEARCH_MIN_TERM_LENGTH 时返回 None。
+    """
+    terms = text.split()
+    if not terms or any(len(term) < SEARCH_MIN_TERM_LENGTH for term in terms):
+        return None
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def search(
+    match: str,
+    types: Tuple[str, ...] = tuple(SEARCH_SOURCES),
+    filters: Optional[Dict[str, Any]] = None,
+    limit: int = 20,
+    after: Optional[Tuple] = None
+) -> List[Dict]:
+    """
+    全文搜索问题/活动/技能，按 bm25 相关度排序
+    
+    match 是 fts_query() 生成的查询；filters 的键是筛选列（status / category），
+    只对有该列的类型生效，不支持该筛选的类型不参与搜索。
+    after 为游标分页的 (rank, type, id)。
+    """
+    filters = {k: v for k, v in (filters or {}).items() if v is not None}
+    parts, params = [], []
+    for source_type in types:
+        table, fts, title_column, filter_column = SEARCH_SOURCES[source_type]
+        if any(column != filter_column for column in filters):
+            continue
+        conditions = [f"{fts} MATCH ?"]
+        params.append(match)
+        for column, value in filters.items():
+            conditions.append(f"c.{column} = ?")
+            params.append(value)
+        parts.append(f"""
+            SELECT '{source_type}' AS type, c.id AS id, c.{title_column} AS title,
+                   snippet({fts}, -1, '<mark>', '</mark>', '…', 16) AS snippet,
+                   bm25({fts}) AS rank
+            FROM {fts} JOIN {table} c ON c.id = {fts}.rowid
+            WHERE {' AND '.join(conditions)}
+        """)
+    if not parts:
+        return []
+
+    where = ""
+    if after is not None:
+        where = f"WHERE ({', '.join(SEARCH_SORT_KEYS)}) > (?, ?, ?)"
+        params.extend(after)
+    with get_db() as conn:
+        cursor = conn.execute(f"""
+            SELECT * FROM ({' UNION ALL '.join(parts)})
+            {where}
+            ORDER BY rank, type, id
+            LIMIT ?
+        """, (*params, limit))
+        return rows_to_list(cursor.fetchall())
+
+
+
+# ==================== 配额 ====================
+
+def utc_today() -> str:
+    """当天日期（UTC，与 CURRENT_TIMESTAMP 一致），用作按天配额的 period"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def reserve_quota(subject: str, scope: str, period: str, limit: int) -> Optional[int]:
+    """
+    原子占用一次配额，返回占用后的已用次数；已达 limit 时返回 None
+    
+    subject 是配额主体（如用户 ID），scope 是配额名，period 是计数窗口
+    （按天配额用 utc_today()，也可以是 "activity:42" 这样的任意键）。
+    单条 UPSERT 完成检查和累加，并发请求不会同时通过检查；
+    在调用方的事务中执行，后续操作失败回滚时占用也随之撤销。
+    """
+    if limit <= 0:
+        return None
+    with get_db() as conn:
+        row = conn.execute("""
+            INSERT INTO quota_usage (subject, scope, period, used)
+            VALUES (?, ?, ?, 1)
+            ON CONFLICT (subject, scope, period)
+            DO UPDATE SET used = used + 1 WHERE used < ?
+            RETURNING used
+        """, (subject, scope, period, limit)).fetchone()
+        return row["used"] if row else None
+
+
+def get_quota_usage(subject: str, scope: str, period: str) -> int:
+    """已用次数"""
+    with get_db() as conn:
+        row = conn.execute("""
+            SELECT used FROM quota_usage
+            WHERE subject = ? AND scope = ? AND period = ?
+        """, (subject, scope, period)).fetchone()
+        return row["used"] if row else 0
+
+
+# ==================== 匹配推荐 ====================
+
+# 可推荐的状态：问题待解决、活动进行中
+_MATCH_OPEN_STATUS = {"questions": config.STATUS_PENDING, "activities": config.STATUS_OPEN}
+
+
+def list_match_items(table: str, after_id: int) -> List[Dict]:
+    """id 大于 after_id 的问题或活动（匹配引擎按 id 水位增量加载），open 表示是否可推荐"""
+    with get_db() as conn:
+        cursor = conn.execute(f"""
+            SELECT id, title, type, description, requirements, difficulty,
+                   status = ? AS open
+            FROM {table} WHERE id > ? ORDER BY id
+        """, (_MATCH_OPEN_STATUS[table], after_id))
+        return rows_to_list(cursor.fetchall())
+
+
+def list_match_changes(table: str, since: Optional[str]) -> Tuple[List[Dict], str]:
+    """
+    updated_at 不早于 since 的问题或活动是否可推荐（匹配引擎据此只更新状态变化的行）
+
+    同时返回下次查询的 since：数据库当前时间回看 config.MATCH_CHANGE_OVERLAP 秒，
+    覆盖提交晚于时间戳的事务。since 为 None 时只返回下次的 since。
+    """
+    with get_db() as conn:
+        next_since = conn.execute(
+            "SELECT datetime('now', ?)", (f"-{int(config.MATCH_CHANGE_OVERLAP)} seconds",)
+        ).fetchone()[0]
+        if since is None:
+            return [], next_since
+        cursor = conn.execute(f"""
+            SELECT id, status = ? AS open FROM {table} WHERE updated_at >= ?
+        """, (_MATCH_OPEN_STATUS[table], since))
+        return rows_to_list(cursor.fetchall()), next_since
+
+
+def get_match_profile(user_id: str) -> Optional[Dict]:
+    """
+    用户的匹配特征：注册时的能力描述和历史提交
+    
+    返回 {"capabilities": JSON 文本, "history": {活动类型: 提交数}, "submitted": 已提交的活动 ID}，
+    用户不存在时返回 None。
+    """
+    with get_db() as conn:
+        user = conn.execute(
+            "SELECT capabilities FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if user is None:
+            return None
+        cursor = conn.execute("""
+            SELECT s.activity_id, a.type
+            FROM submissions s JOIN activities a ON a.id = s.activity_id
+            WHERE s.submitter_id = ?
+        """, (user_id,))
+        history: Dict[str, int] = {}
+        submitted = set()
+        for row in cursor:
+            history[row["type"]] = history.get(row["type"], 0) + 1
+            submitted.add(row["activity_id"])
+        return {
+            "capabilities": user["capabilities"],
+            "history": history,
+            "submitted": submitted
+        }
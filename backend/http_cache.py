@@ -0,0 +1,95 @@
+"""
+jungle-board - 条件请求与响应缓存模块
+
+列表和详情的 ETag 由所依赖表的版本号（db.table_generation）计算，
+不需要查询数据库：客户端带 If-None-Match 轮询时，数据没变直接返回 304。
+版本号变化时 ETag 随之变化，服务端缓存的响应也就自然失效。
+
+表版本号只记录本进程内的写入，ETag 和缓存另按 config.HTTP_CACHE_TTL
+分段，其他进程的写入最迟在一个周期后可见（与列表总数缓存一致）。
+"""
+
+import hashlib
+import time
+import uuid
+from email.utils import formatdate
+from typing import Any, Awaitable, Callable, Dict, Sequence
+
+from fastapi import Request, Response
+
+import config
+import metrics
+import models
+from cache import TTLCache
+from db import table_generation, table_modified_at
+
+# 进程标识：重启或多进程时版本号从 0 开始，ETag 不会误撞
+_PROCESS_TOKEN = uuid.uuid4().hex[:8]
+
+_responses = TTLCache("responses", config.HTTP_CACHE_SIZE, config.HTTP_CACHE_TTL)
+
+
+def _etag(request: Request, tables: Sequence[str]) -> str:
+    """由请求路径、查询参数和表版本号计算 ETag"""
+    state = (
+        _PROCESS_TOKEN,
+        int(time.time() // config.HTTP_CACHE_TTL),
+        request.url.path,
+        sorted(request.query_params.multi_items()),
+        [table_generation(table) for table in tables]
+    )
+    digest = hashlib.blake2b(repr(state).encode(), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match 弱比较（忽略 W/ 前缀）"""
+    if if_none_match.strip() == "*":
+        return True
+    tag = etag[2:]
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == tag:
+            return True
+    return False
+
+
+def json_response(content: Any) -> Response:
+    """用 msgspec 编码的 JSON 响应（返回值包含行模型、不需要 ETag 时使用）"""
+    return Response(content=models.encode(content), media_type="application/json")
+
+
+async def conditional_json(
+    request: Request,
+    tables: Sequence[str],
+    build: Callable[[], Awaitable[Dict]]
+) -> Response:
+    """
+    带 ETag / Last-Modified 的 JSON 响应
+
+    tables 是响应内容依赖的表；build 生成响应内容，只在客户端缓存和
+    服务端缓存都未命中时调用。表版本号在 build 之前读取，
+    缓存的内容只会比 ETag 新，不会更旧。
+    """
+    etag = _etag(request, tables)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(
+            max(table_modified_at(table) for table in tables), usegmt=True
+        ),
+        "Cache-Control": "no-cache"
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _matches(if_none_match, etag):
+        metrics.incr("http_not_modified")
+        return Response(status_code=304, headers=headers)
+
+    body = _responses.get(etag)
+    if body is None:
+        body = models.encode(await build())
+        _responses.set(etag, body)
+
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,315 @@
+"""
+jungle-board - 积分排行榜模块
+
+排行榜常驻内存：启动时从 users 表加载一次，之后由 db 模块在每次积分
+变更提交后更新，请求不再扫描 users 表。
+
+每个榜单是一个可索引跳表（每层链接记录跨越的节点数），
+按名次取前 N 名和查询某用户名次都是 O(log n)。
+排序规则（docs/game_rules.md）：积分高的在前，同分先达到该分数的在前。
+
+多进程部署时，其他进程的积分变更由定时对账同步（scheduler 每隔
+config.LEADERBOARD_SYNC_INTERVAL 秒加载 updated_at 不早于上次水位的用户），
+最多延迟一个周期可见。
+"""
+
+import random
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import TYPE_AI, TYPE_HUMAN
+
+# 排序键：(-积分, 达到该积分的时间, user_id)，user_id 保证唯一
+Key = Tuple[int, str, str]
+
+_MAX_LEVEL = 32
+_P = 0.25
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key: Optional[Key], level: int):
+        self.key = key
+        self.next: List[Optional["_Node"]] = [None] * level
+        # width[i]：沿第 i 层走到 next[i] 跨过的底层节点数
+        self.width = [1] * level
+
+
+class IndexableSkipList:
+    """有序且可按名次访问的跳表（键必须唯一）"""
+
+    def __init__(self):
+        self._head = _Node(None, _MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < _MAX_LEVEL and random.random() < _P:
+            level += 1
+        return level
+
+    def insert(self, key: Key) -> None:
+        """插入键"""
+        update = [self._head] * _MAX_LEVEL
+        ranks = [0] * _MAX_LEVEL
+        node, rank = self._head, 0
+        for i in range(self._level - 1, -1, -1):
+            while node.next[i] is not None and node.next[i].key < key:
+                rank += node.width[i]
+                node = node.next[i]
+            update[i], ranks[i] = node, rank
+
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                update[i], ranks[i] = self._head, 0
+                self._head.width[i] = self._size + 1
+            self._level = level
+
+        new = _Node(key, level)
+        for i in range(level):
+            prev = update[i]
+            new.next[i] = prev.next[i]
+            new.width[i] = prev.width[i] - (rank - ranks[i])
+            prev.next[i] = new
+            prev.width[i] = rank - ranks[i] + 1
+        for i in range(level, self._level):
+            update[i].width[i] += 1
+        self._size += 1
+
+    def remove(self, key: Key) -> bool:
+        """删除键，不存在时返回 False"""
+        update = [self._head] * _MAX_LEVEL
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.next[i] is not None and node.next[i].key < key:
+                node = node.next[i]
+            update[i] = node
+
+        target = node.next[0]
+        if target is None or target.key != key:
+            return False
+
+        for i in range(self._level):
+            if update[i].next[i] is target:
+                update[i].width[i] += target.width[i] - 1
+                update[i].next[i] = target.next[i]
+            else:
+                update[i].width[i] -= 1
+        while self._level > 1 and self._head.next[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+        return True
+
+    def index(self, key: Key) -> Optional[int]:
+        """键的名次（从 0 开始），不存在时返回 None"""
+        node, rank = self._head, 0
+        for i in range(self._level - 1, -1, -1):
+            while node.next[i] is not None and node.next[i].key <= key:
+                rank += node.width[i]
+                node = node.next[i]
+        if node is self._head or node.key != key:
+            return None
+        return rank - 1
+
+    def slice(self, start: int, count: int) -> List[Key]:
+        """从第 start 名开始（从 0 开始）取 count 个键"""
+        if start < 0 or start >= self._size or count <= 0:
+            return []
+        node, rank = self._head, 0
+        for i in range(self._level - 1, -1, -1):
+            while node.next[i] is not None and rank + node.width[i] <= start + 1:
+                rank += node.width[i]
+                node = node.next[i]
+        keys = []
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+def _now() -> str:
+    """与 CURRENT_TIMESTAMP 格式一致的 UTC 时间（带微秒，便于同秒内排序）"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+class Leaderboard:
+    """总榜 + 人类榜 + AI 榜"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._boards: Dict[Optional[str], IndexableSkipList] = {
+            None: IndexableSkipList(),
+            TYPE_HUMAN: IndexableSkipList(),
+            TYPE_AI: IndexableSkipList()
+        }
+        # user_id -> (排序键, 用户名, 类型)
+        self._users: Dict[str, Tuple[Key, Optional[str], str]] = {}
+        # 已同步到的最大 users.updated_at（对账水位）
+        self._watermark = ""
+
+    def _boards_for(self, user_type: str) -> List[IndexableSkipList]:
+        boards = [self._boards[None]]
+        if user_type in self._boards:
+            boards.append(self._boards[user_type])
+        return boards
+
+    def _put(self, user_id: str, username: Optional[str], user_type: str,
+             score: int, reached_at: str) -> None:
+        old = self._users.get(user_id)
+        if old is not None:
+            for board in self._boards_for(old[2]):
+                board.remove(old[0])
+        key = (-score, reached_at, user_id)
+        for board in self._boards_for(user_type):
+            board.insert(key)
+        self._users[user_id] = (key, username, user_type)
+
+    def load(self, users: Iterable[Dict]) -> None:
+        """
+        从 users 表的行重建榜单（启动时调用）
+
+        行需包含 user_id, username, type, score, updated_at；
+        没有积分获得时间的记录，用 updated_at 近似同分排序。
+        """
+        with self._lock:
+            self._boards = {board_type: IndexableSkipList() for board_type in self._boards}
+            self._users.clear()
+            self._watermark = ""
+            for user in users:
+                self._put(
+                    user["user_id"], user["username"], user["type"],
+                    user["score"] or 0, user["updated_at"] or ""
+                )
+                self._watermark = max(self._watermark, user["updated_at"] or "")
+
+    def sync(self, users: Iterable[Dict]) -> int:
+        """
+        合并 users 表中有变更的行（定时对账），返回实际变动的用户数
+
+        新用户上榜；积分变化时以 updated_at 作为达到该积分的时间；
+        积分未变时保持原有同分顺序，只更新用户名和类型。
+        """
+        changed = 0
+        with self._lock:
+            for user in users:
+                user_id, score = user["user_id"], user["score"] or 0
+                updated_at = user["updated_at"] or ""
+                self._watermark = max(self._watermark, updated_at)
+                old = self._users.get(user_id)
+                if old is None or -old[0][0] != score:
+                    self._put(user_id, user["username"], user["type"], score, updated_at)
+                elif old[1:] != (user["username"], user["type"]):
+                    self._put(user_id, user["username"], user["type"], score, old[0][1])
+                else:
+                    continue
+                changed += 1
+        return changed
+
+    def watermark(self) -> str:
+        """已同步到的最大 updated_at"""
+        with self._lock:
+            return self._watermark
+
+    def set_user(self, user_id: str, username: Optional[str],
+                 user_type: str, score: int) -> None:
+        """加入或更新用户"""
+        with self._lock:
+            self._put(user_id, username, user_type, score, _now())
+
+    def update_score(self, user_id: str, score: int) -> None:
+        """积分变更（积分未变时保持原有同分顺序）"""
+        with self._lock:
+            old = self._users.get(user_id)
+            if old is None or -old[0][0] == score:
+                return
+            self._put(user_id, old[1], old[2], score, _now())
+
+    def top(self, user_type: Optional[str] = None, limit: int = 100,
+            offset: int = 0) -> List[Dict]:
+        """榜单第 offset+1 名起的 limit 名"""
+        with self._lock:
+            keys = self._boards[user_type].slice(offset, limit)
+            return [
+                {
+                    "rank": offset + i + 1,
+                    "user_id": user_id,
+                    "username": self._users[user_id][1],
+                    "type": self._users[user_id][2],
+                    "score": -neg_score
+                }
+                for i, (neg_score, _, user_id) in enumerate(keys)
+            ]
+
+    def rank(self, user_id: str) -> Optional[Dict]:
+        """用户在总榜和所属类型榜中的名次"""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            key, username, user_type = entry
+            result = {
+                "user_id": user_id,
+                "username": username,
+                "type": user_type,
+                "score": -key[0],
+                "rank": self._boards[None].index(key) + 1,
+                "total": len(self._boards[None])
+            }
+            if user_type in self._boards:
+                board = self._boards[user_type]
+                result["type_rank"] = board.index(key) + 1
+                result["type_total"] = len(board)
+            return result
+
+    def has_board(self, board_type: Optional[str]) -> bool:
+        return board_type in self._boards
+
+
+_leaderboard = Leaderboard()
+
+
+def load(users: Iterable[Dict]) -> None:
+    """从 users 表重建排行榜"""
+    _leaderboard.load(users)
+
+
+def sync(users: Iterable[Dict]) -> int:
+    """合并其他进程的积分变更"""
+    return _leaderboard.sync(users)
+
+
+def watermark() -> str:
+    """对账水位（下次只需加载 updated_at 不早于它的用户）"""
+    return _leaderboard.watermark()
+
+
+def set_user(user_id: str, username: Optional[str], user_type: str, score: int) -> None:
+    """新用户上榜"""
+    _leaderboard.set_user(user_id, username, user_type, score)
+
+
+def update_score(user_id: str, score: int) -> None:
+    """用户积分变更"""
+    _leaderboard.update_score(user_id, score)
+
+
+def top(user_type: Optional[str] = None, limit: int = 100, offset: int = 0) -> List[Dict]:
+    """取榜单前若干名（user_type 为 None 时为总榜）"""
+    return _leaderboard.top(user_type, limit, offset)
+
+
+def rank(user_id: str) -> Optional[Dict]:
+    """查询用户名次"""
+    return _leaderboard.rank(user_id)
+
+
+def has_board(user_type: Optional[str]) -> bool:
+    """是否存在该类型的榜单"""
+    return _leaderboard.has_board(user_type)
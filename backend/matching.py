@@ -0,0 +1,337 @@
+"""
+jungle-board - 智能匹配模块
+
+按 docs/ideas/04-smart-matching.md 的匹配度（技术栈、难度、历史表现、
+领域、专长加权）为用户推荐待解决的问题和进行中的活动，但不逐对计算：
+
+- 问题/活动编码为特征矩阵：每行一项，每列一个能力词
+  （该词是否出现在标题、类型、描述或需求中），另有难度和类型两列向量
+- 用户编码为三组能力词（技术栈/领域/专长）、擅长的难度和历史提交的类型分布
+- 所有 (项, 用户) 对的匹配度由矩阵乘法和广播一次算出
+
+矩阵常驻内存并增量维护：新的问题/活动按 id 水位追加行，状态变化
+按 updated_at 只更新上次同步以来变化的行，新出现的能力词追加列（最多
+config.MATCH_MAX_VOCABULARY 列，之后的新词只在本次请求中临时计算，
+不进入矩阵）；只在问题/活动表有写入，或超过 config.MATCH_REFRESH_INTERVAL
+时才查询数据库（其他进程的写入最迟在一个周期后可见）。
+"""
+
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+import config
+import db
+
+KIND_QUESTION = "question"
+KIND_ACTIVITY = "activity"
+# 推荐项类型 -> 表
+KIND_TABLES = {KIND_QUESTION: "questions", KIND_ACTIVITY: "activities"}
+_KIND_CODES = {KIND_QUESTION: 0, KIND_ACTIVITY: 1}
+
+# 能力描述中的词表字段及其权重
+CAPABILITY_FIELDS = {
+    "technical": config.MATCH_WEIGHT_TECHNICAL,
+    "domains": config.MATCH_WEIGHT_DOMAIN,
+    "specialties": config.MATCH_WEIGHT_SPECIALTY
+}
+_DIFFICULTY_LEVELS = {
+    config.DIFFICULTY_EASY: 0.0,
+    config.DIFFICULTY_MEDIUM: 1.0,
+    config.DIFFICULTY_HARD: 2.0
+}
+
+
+def parse_capabilities(raw: Any) -> Dict:
+    """
+    校验并规范化注册时提交的能力描述
+
+    格式：{"technical": [...], "domains": [...], "specialties": [...], "difficulty": "medium"}，
+    都是可选的；词统一为小写并去重，每组最多 config.MATCH_MAX_TERMS_PER_FIELD 个，
+    每个最长 config.MATCH_MAX_TERM_LENGTH 个字符。格式不对时抛出 ValueError。
+    """
+    if raw is None:
+        return {}
+    if not isinstance(raw, dict):
+        raise ValueError("capabilities must be an object")
+
+    capabilities: Dict[str, Any] = {}
+    for field in CAPABILITY_FIELDS:
+        terms = raw.get(field, [])
+        if not isinstance(terms, list) or not all(isinstance(term, str) for term in terms):
+            raise ValueError(f"capabilities.{field} must be a list of strings")
+        terms = list(dict.fromkeys(term.strip().lower() for term in terms if term.strip()))
+        if len(terms) > config.MATCH_MAX_TERMS_PER_FIELD:
+            raise ValueError(
+                f"capabilities.{field} must have at most {config.MATCH_MAX_TERMS_PER_FIELD} terms"
+            )
+        if any(len(term) > config.MATCH_MAX_TERM_LENGTH for term in terms):
+            raise ValueError(
+                f"capabilities.{field} terms must be at most {config.MATCH_MAX_TERM_LENGTH} characters"
+            )
+        if terms:
+            capabilities[field] = terms
+
+    difficulty = raw.get("difficulty")
+    if difficulty is not None:
+        if difficulty not in _DIFFICULTY_LEVELS:
+            raise ValueError(f"capabilities.difficulty must be one of: {', '.join(_DIFFICULTY_LEVELS)}")
+        capabilities["difficulty"] = difficulty
+    return capabilities
+
+
+class _Agent:
+    """一个用户的匹配特征"""
+
+    __slots__ = ("terms", "difficulty", "history", "submitted")
+
+    def __init__(self, profile: Dict):
+        try:
+            capabilities = json.loads(profile["capabilities"] or "{}")
+        except ValueError:
+            capabilities = {}
+        self.terms: Dict[str, List[str]] = {
+            field: capabilities.get(field, []) for field in CAPABILITY_FIELDS
+        }
+        self.difficulty = _DIFFICULTY_LEVELS.get(capabilities.get("difficulty"), 1.0)
+        # 历史表现：各类型活动占该用户全部提交的比例
+        total = sum(profile["history"].values())
+        self.history = {
+            item_type: count / total for item_type, count in profile["history"].items()
+        }
+        self.submitted = profile["submitted"]
+
+
+class MatchingEngine:
+    """问题/活动特征矩阵 + 批量打分"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._terms: Dict[str, int] = {}    # 能力词 -> 列
+        self._types: Dict[str, int] = {}    # 问题/活动类型 -> 编号
+        self._type_names: List[str] = []
+        self._size = 0
+        # 以下数组按容量预分配，前 _size 行有效
+        self._features = np.zeros((0, 0), dtype=np.float32)
+        self._difficulty = np.zeros(0, dtype=np.float32)
+        self._type_index = np.zeros(0, dtype=np.int32)
+        self._kind = np.zeros(0, dtype=np.int8)
+        self._active = np.zeros(0, dtype=bool)
+        self._items: List[tuple] = []      # 每行的 (类型, id, 标题)
+        self._texts: List[str] = []         # 每行用于匹配能力词的小写文本
+        self._rows: Dict[tuple, int] = {}   # (类型, id) -> 行
+        self._watermarks = {kind: 0 for kind in KIND_TABLES}
+        # 下次只需检查 updated_at 不早于它的行（None 表示还没有加载过）
+        self._changed_since: Dict[str, Optional[str]] = {kind: None for kind in KIND_TABLES}
+        self._generations: Optional[tuple] = None
+        self._synced_at = 0.0
+
+    # ---------- 增量维护 ----------
+
+    def _reserve(self, rows: int, cols: int) -> None:
+        """保证矩阵至少有 rows 行、cols 列（容量按倍数增长）"""
+        capacity, width = self._features.shape
+        if rows <= capacity and cols <= width:
+            return
+        capacity = max(rows, capacity * 2 if rows > capacity else capacity, 64)
+        width = max(cols, width * 2 if cols > width else width, 64)
+        features = np.zeros((capacity, width), dtype=np.float32)
+        features[:self._size, :len(self._terms)] = self._features[:self._size, :len(self._terms)]
+        self._features = features
+        for name in ("_difficulty", "_type_index", "_kind", "_active"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def _match_term(self, term: str) -> np.ndarray:
+        """能力词在前 _size 行中是否出现（逐行计算）"""
+        return np.fromiter(
+            (term in text for text in self._texts), dtype=np.float32, count=self._size
+        )
+
+    def _term_column(self, term: str) -> Optional[int]:
+        """
+        能力词所在的列；新词在词表未满时追加一列并对已有的行计算，
+        词表已满时返回 None（由调用方临时计算，不进入矩阵）
+        """
+        col = self._terms.get(term)
+        if col is None and len(self._terms) < config.MATCH_MAX_VOCABULARY:
+            col = len(self._terms)
+            self._reserve(self._size, col + 1)
+            self._terms[term] = col
+            self._features[:self._size, col] = self._match_term(term)
+        return col
+
+    def _type_code(self, item_type: str) -> int:
+        code = self._types.get(item_type)
+        if code is None:
+            code = self._types[item_type] = len(self._type_names)
+            self._type_names.append(item_type)
+        return code
+
+    def _add_item(self, kind: str, row: Dict) -> None:
+        text = " ".join(
+            str(row[field]) for field in ("title", "type", "description", "requirements")
+            if row[field]
+        ).lower()
+        i = self._size
+        self._reserve(i + 1, len(self._terms))
+        for term, col in self._terms.items():
+            if term in text:
+                self._features[i, col] = 1.0
+        self._difficulty[i] = _DIFFICULTY_LEVELS.get(row["difficulty"], 1.0)
+        self._type_index[i] = self._type_code(row["type"])
+        self._kind[i] = _KIND_CODES[kind]
+        self._active[i] = bool(row["open"])
+        self._items.append((kind, row["id"], row["title"]))
+        self._texts.append(text)
+        self._rows[(kind, row["id"])] = i
+        self._size += 1
+
+    def _sync(self) -> None:
+        """加载新的问题/活动并刷新哪些项可推荐（调用方持有锁）"""
+        generations = tuple(db.table_generation(table) for table in KIND_TABLES.values())
+        now = time.monotonic()
+        if generations == self._generations and now - self._synced_at < config.MATCH_REFRESH_INTERVAL:
+            return
+
+        for kind, table in KIND_TABLES.items():
+            # 已加载的行只更新上次同步以来有变化的（先于新行查询，
+            # 两次查询之间变化的新行由下面的加载读到最新状态）
+            changes, self._changed_since[kind] = db.list_match_changes(
+                table, self._changed_since[kind]
+            )
+            for row in changes:
+                i = self._rows.get((kind, row["id"]))
+                if i is not None:
+                    self._active[i] = bool(row["open"])
+            for row in db.list_match_items(table, self._watermarks[kind]):
+                self._add_item(kind, row)
+                self._watermarks[kind] = row["id"]
+
+        self._generations = generations
+        self._synced_at = now
+
+    def refresh(self) -> None:
+        """同步问题/活动（启动时预热）"""
+        with self._lock:
+            self._sync()
+
+    # ---------- 打分 ----------
+
+    def _scores(self, agents: Sequence[_Agent]) -> np.ndarray:
+        """
+        所有有效行与 agents 的匹配度矩阵（行 × 用户，取值 0-1）
+
+        能力词分量：该组能力词在项中命中 c 个时得 1 - 0.5^c；
+        难度分量：1 - |难度差| / 2；历史分量：该用户提交中同类型活动的比例。
+        """
+        n = self._size
+        # 只取这批用户用到的能力词列，计算量与总词表大小无关；
+        # 不在词表中的词临时计算一列，接在矩阵列之后
+        columns: Dict[str, int] = {}
+        extra: Dict[str, int] = {}
+        for term in dict.fromkeys(
+            term for agent in agents for terms in agent.terms.values() for term in terms
+        ):
+            col = self._term_column(term)
+            if col is None:
+                extra[term] = len(extra)
+            else:
+                columns[term] = col
+        used = sorted(set(columns.values()))
+        offset = {col: i for i, col in enumerate(used)}
+        position = {term: offset[col] for term, col in columns.items()}
+        position.update({term: len(used) + i for term, i in extra.items()})
+
+        features = np.empty((n, len(position)), dtype=np.float32)
+        features[:, :len(used)] = self._features[:n, used]
+        for term, i in extra.items():
+            features[:, len(used) + i] = self._match_term(term)
+
+        scores = np.zeros((n, len(agents)), dtype=np.float32)
+        for field, weight in CAPABILITY_FIELDS.items():
+            mask = np.zeros((len(position), len(agents)), dtype=np.float32)
+            for j, agent in enumerate(agents):
+                mask[[position[term] for term in agent.terms[field]], j] = 1.0
+            scores += weight * (1.0 - np.power(0.5, features @ mask))
+
+        agent_difficulty = np.array([agent.difficulty for agent in agents], dtype=np.float32)
+        scores += config.MATCH_WEIGHT_DIFFICULTY * (
+            1.0 - np.abs(self._difficulty[:n, None] - agent_difficulty[None, :]) / 2.0
+        )
+
+        history = np.zeros((max(len(self._types), 1), len(agents)), dtype=np.float32)
+        for j, agent in enumerate(agents):
+            for item_type, share in agent.history.items():
+                if item_type in self._types:
+                    history[self._types[item_type], j] = share
+        scores += config.MATCH_WEIGHT_HISTORY * history[self._type_index[:n]]
+        return scores
+
+    def _reasons(self, row: int, agent: _Agent) -> Dict:
+        """推荐理由：命中的能力词和难度、历史分量"""
+        reasons: Dict[str, Any] = {}
+        for field in CAPABILITY_FIELDS:
+            matched = [term for term in agent.terms[field]
+                       if (self._features[row, self._terms[term]] if term in self._terms
+                           else term in self._texts[row])]
+            if matched:
+                reasons[field] = matched
+        reasons["difficulty"] = round(
+            1.0 - abs(float(self._difficulty[row]) - agent.difficulty) / 2.0, 2
+        )
+        item_type = self._type_names[self._type_index[row]]
+        reasons["history"] = round(agent.history.get(item_type, 0.0), 2)
+        return reasons
+
+    def recommend(self, profile: Dict, limit: int, kind: Optional[str] = None) -> List[Dict]:
+        """按匹配度取前 limit 个可推荐的项（跳过用户已提交过的活动）"""
+        agent = _Agent(profile)
+        with self._lock:
+            self._sync()
+            scores = self._scores([agent])[:, 0]
+
+            candidates = self._active[:self._size].copy()
+            if kind is not None:
+                candidates &= self._kind[:self._size] == _KIND_CODES[kind]
+            for activity_id in agent.submitted:
+                row = self._rows.get((KIND_ACTIVITY, activity_id))
+                if row is not None:
+                    candidates[row] = False
+            candidates = np.flatnonzero(candidates)
+
+            if limit < len(candidates):
+                candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+            top = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+            return [
+                {
+                    "type": self._items[row][0],
+                    "id": self._items[row][1],
+                    "title": self._items[row][2],
+                    "match_score": round(float(scores[row]), 4),
+                    "match_reason": self._reasons(row, agent)
+                }
+                for row in top
+            ]
+
+
+_engine = MatchingEngine()
+
+
+def refresh() -> None:
+    """加载问题/活动特征矩阵"""
+    _engine.refresh()
+
+
+def recommend(user_id: str, limit: int = 10, kind: Optional[str] = None) -> Optional[List[Dict]]:
+    """为用户推荐问题/活动（kind 限定类型），用户不存在时返回 None"""
+    profile = db.get_match_profile(user_id)
+    if profile is None:
+        return None
+    return _engine.recommend(profile, limit, kind)
@@ -0,0 +1,98 @@
+"""
+jungle-board - 运行指标模块
+
+进程内的轻量指标：计数器、仪表值、耗时统计（count/sum/max）
+以及事件循环延迟监控。通过 GET /metrics 查看。
+"""
+
+import asyncio
+import threading
+import time
+from typing import Dict
+
+
+class Summary:
+    """耗时/数值统计"""
+
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "max": self.max
+        }
+
+
+_lock = threading.Lock()
+_counters: Dict[str, int] = {}
+_gauges: Dict[str, float] = {}
+_summaries: Dict[str, Summary] = {}
+_routes: Dict[str, Summary] = {}
+
+
+def incr(name: str, amount: int = 1) -> None:
+    """计数器累加"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def set_gauge(name: str, value: float) -> None:
+    """设置仪表值"""
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, value: float) -> None:
+    """记录一次数值（如耗时、批大小）"""
+    with _lock:
+        summary = _summaries.get(name)
+        if summary is None:
+            summary = _summaries[name] = Summary()
+        summary.observe(value)
+
+
+def observe_route(route: str, seconds: float) -> None:
+    """记录一次路由耗时"""
+    with _lock:
+        summary = _routes.get(route)
+        if summary is None:
+            summary = _routes[route] = Summary()
+        summary.observe(seconds)
+
+
+def snapshot() -> Dict:
+    """导出当前所有指标"""
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "summaries": {name: s.to_dict() for name, s in _summaries.items()},
+            "routes": {name: s.to_dict() for name, s in _routes.items()}
+        }
+
+
+async def monitor_event_loop_lag(interval: float) -> None:
+    """
+    事件循环延迟监控（后台任务）
+
+    每隔 interval 秒醒来一次，实际睡眠时长超出 interval 的部分
+    就是事件循环被阻塞的时间。
+    """
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = time.perf_counter() - start - interval
+        observe("event_loop_lag_seconds", max(lag, 0.0))
+        set_gauge("event_loop_lag_seconds", max(lag, 0.0))
@@ -0,0 +1,124 @@
+"""
+jungle-board - 行模型模块
+
+列表查询的行直接由游标返回的元组构造为 msgspec Struct
+（不经过 sqlite3.Row 和 dict），再用 msgspec 编码为 JSON，
+省去每行一个 dict 的分配和 FastAPI jsonable_encoder 的逐字段遍历。
+
+字段顺序即 SELECT 的列顺序（见 columns）；表结构增加列时在这里同步添加。
+所有字段都是标量，gc=False 让这些对象不进入循环垃圾回收的跟踪。
+"""
+
+from itertools import starmap
+from typing import Any, Iterable, List, Optional, Type
+
+import msgspec
+
+
+class User(msgspec.Struct, gc=False):
+    id: int
+    user_id: str
+    username: Optional[str]
+    avatar: Optional[str]
+    type: str
+    role: Optional[str]
+    client_id: Optional[str]
+    client_secret_hash: Optional[str]
+    score: Optional[int]
+    capabilities: Optional[str]
+    created_at: Optional[str]
+    updated_at: Optional[str]
+
+
+class Question(msgspec.Struct, gc=False):
+    id: int
+    title: str
+    type: str
+    description: Optional[str]
+    requirements: str
+    value_expectation: Optional[str]
+    difficulty: Optional[str]
+    created_by_id: str
+    status: Optional[str]
+    views: int
+    votes: int
+    participants: int
+    heat: int
+    created_at: Optional[str]
+    updated_at: Optional[str]
+
+
+class Activity(msgspec.Struct, gc=False):
+    id: int
+    question_id: int
+    title: str
+    type: str
+    description: Optional[str]
+    requirements: Optional[str]
+    difficulty: Optional[str]
+    status: Optional[str]
+    participants_count: int
+    created_at: Optional[str]
+    updated_at: Optional[str]
+
+
+class Submission(msgspec.Struct, gc=False):
+    id: int
+    activity_id: int
+    submitter_id: str
+    submitter_name: str
+    content: str
+    submitted_at: Optional[str]
+    vote_count: Optional[int]
+    rank: Optional[int]
+    winner: Optional[int]
+
+
+class RankedSubmission(msgspec.Struct, gc=False):
+    """排名列表中的提交（不含内容）"""
+    id: int
+    submitter_id: str
+    submitter_name: str
+    submitted_at: Optional[str]
+    vote_count: int
+    rank: int
+    winner: int
+
+
+class Skill(msgspec.Struct, gc=False):
+    id: int
+    name: str
+    category: str
+    description: Optional[str]
+    value_level: Optional[str]
+    author_id: str
+    author_name: str
+    downloads: int
+    rating: float
+    rating_count: int
+    rank_score: float
+    created_at: Optional[str]
+    updated_at: Optional[str]
+
+
+def columns(model: Type[msgspec.Struct]) -> str:
+    """模型对应的 SELECT 列清单"""
+    return ", ".join(model.__struct_fields__)
+
+
+def from_rows(model: Type[msgspec.Struct], rows: Iterable[tuple]) -> List:
+    """由游标返回的元组构造模型列表"""
+    return list(starmap(model, rows))
+
+
+_encoder = msgspec.json.Encoder()
+
+
+def encode(content: Any) -> bytes:
+    """编码为 JSON（dict、list 和模型可以混合嵌套）"""
+    return _encoder.encode(content)
+
+
+def encode_lines(items: Iterable[Any]) -> bytes:
+    """编码为 NDJSON（每项一行）"""
+    return _encoder.encode_lines(items)
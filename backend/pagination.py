@@ -0,0 +1,47 @@
+"""
+jungle-board - 游标分页模块
+
+游标是不透明的 token，内容是上一页最后一行的排序键
+（如问题列表的 heat, created_at, id，见 db 中的 *_SORT_KEYS）。下一页用
+(排序键...) < (游标值...) 直接在复合索引上定位，
+翻页深度不再影响查询速度（LIMIT/OFFSET 需要先跳过前面所有行）。
+"""
+
+import base64
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+
+def encode_cursor(values: Sequence) -> str:
+    """把排序键编码为游标"""
+    raw = json.dumps(list(values), separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], keys: Sequence[str]) -> Optional[Tuple]:
+    """解析游标，返回排序键的值；游标无效时返回 400"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # 只接受 SQLite 能绑定的标量（排序键的值都是数字、字符串或 NULL）
+    if not all(value is None or isinstance(value, (int, float, str)) for value in values):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return tuple(values)
+
+
+def next_cursor(items: List[Any], keys: Sequence[str], limit: int) -> Optional[str]:
+    """生成下一页游标（本页不满说明已到末尾，返回 None；items 为字典或行模型）"""
+    if limit <= 0 or len(items) < limit:
+        return None
+    last = items[-1]
+    if isinstance(last, dict):
+        return encode_cursor([last[key] for key in keys])
+    return encode_cursor([getattr(last, key) for key in keys])
@@ -6,3 +6,6 @@ from . import users
 from . import questions
 from . import activities
 from . import skills
+from . import leaderboard
+from . import search
+from . import recommendations
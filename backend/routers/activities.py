@@ -2,41 +2,72 @@
 jungle-board - 活动管理路由
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from datetime import datetime
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import json
 
 import config
 import auth
 from db import (
     get_activity, create_activity, list_activities,
-    update_activity_status, get_submissions, create_submission
+    update_activity_status, join_activity, get_submissions, iter_submissions,
+    create_submission, create_submissions, get_user, count_rows, run_db,
+    vote_submission, unvote_submission, get_submission_ranking, close_activity,
+    ACTIVITY_SORT_KEYS, RANKING_SORT_KEYS
 )
+from writer import run_write
+from pagination import decode_cursor, next_cursor
+from streaming import ndjson, ndjson_response, NDJSON_MEDIA_TYPE
+from http_cache import conditional_json, json_response
 
 router = APIRouter(prefix="/api/activities", tags=["Activities"])
 
 
 @router.get("/")
 async def get_all_activities(
+    request: Request,
     status: Optional[str] = None,
     limit: int = 100,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None
 ) -> Dict:
-    """获取所有活动列表"""
-    activities = list_activities(status=status, limit=limit, offset=offset)
-    return {"activities": activities, "total": len(activities)}
+    """
+    获取所有活动列表（cursor 为上一页返回的 next_cursor，优先于 offset）
+    
+    带 ETag，活动表未修改时 If-None-Match 返回 304。
+    """
+    after = decode_cursor(cursor, ACTIVITY_SORT_KEYS)
+
+    async def build() -> Dict:
+        activities = await run_db(
+            list_activities, status=status, limit=limit,
+            offset=0 if after else offset, after=after
+        )
+        total = await run_db(count_rows, "activities", {"status": status})
+        return {
+            "activities": activities,
+            "total": total,
+            "next_cursor": next_cursor(activities, ACTIVITY_SORT_KEYS, limit)
+        }
+
+    return await conditional_json(request, ("activities",), build)
 
 
 @router.get("/{activity_id}")
-async def get_single_activity(activity_id: int) -> Dict:
-    """获取单个活动详情"""
-    activity = get_activity(activity_id)
-    
-    if not activity:
-        raise HTTPException(status_code=404, detail="Activity not found")
-    
-    return activity
+async def get_single_activity(activity_id: int, request: Request) -> Dict:
+    """获取单个活动详情（带 ETag）"""
+
+    async def build() -> Dict:
+        activity = await run_db(get_activity, activity_id)
+        
+        if not activity:
+            raise HTTPException(status_code=404, detail="Activity not found")
+        
+        return activity
+
+    return await conditional_json(request, ("activities",), build)
 
 
 @router.post("/{activity_id}/join")
@@ -50,52 +81,44 @@ async def join_single_activity(activity_id: int, request: Dict) -> Dict:
         raise HTTPException(status_code=400, detail="agent_id or user_id required")
     
     # 检查用户存在
-    from db import get_user
-    user = get_user(entity_id)
+    user = await run_db(get_user, entity_id)
     if not user:
         raise HTTPException(status_code=403, detail="User not registered")
     
-    # 检查活动是否存在
-    activity = get_activity(activity_id)
-    if not activity:
+    # 加入活动（已加入时不重复计数）
+    result = await run_write(join_activity, activity_id, entity_id)
+    if result is None:
         raise HTTPException(status_code=404, detail="Activity not found")
     
-    # 解析 participants
-    participants_str = activity.get("participants", "[]")
-    try:
-        participants = json.loads(participants_str) if isinstance(participants_str, str) else participants_str
-    except:
-        participants = []
-    
-    # 检查是否已加入
-    if entity_id in participants:
-        return {"message": "Already joined", "activity_id": activity_id}
-    
-    # 加入活动
-    participants.append(entity_id)
-    
-    # TODO: 更新 participants 到数据库
-    # 暂时返回成功
+    if not result["joined"]:
+        return {
+            "message": "Already joined",
+            "activity_id": activity_id,
+            "participants_count": result["participants_count"]
+        }
     
     return {
         "message": "Joined successfully",
         "activity_id": activity_id,
-        "participants_count": len(participants)
+        "participants_count": result["participants_count"]
     }
 
 
 @router.get("/{activity_id}/submissions")
-async def get_activity_submissions(activity_id: int) -> Dict:
-    """获取活动的所有提交"""
+async def get_activity_submissions(activity_id: int, stream: bool = False) -> Dict:
+    """获取活动的所有提交（stream=true 时以 NDJSON 逐行流式导出）"""
     
     # 检查活动是否存在
-    activity = get_activity(activity_id)
+    activity = await run_db(get_activity, activity_id)
     if not activity:
         raise HTTPException(status_code=404, detail="Activity not found")
     
-    submissions = get_submissions(activity_id)
+    if stream:
+        return ndjson_response(iter_submissions(activity_id))
+    
+    submissions = await run_db(get_submissions, activity_id)
     
-    return {"submissions": submissions, "total": len(submissions)}
+    return json_response({"submissions": submissions, "total": len(submissions)})
 
 
 @router.post("/{activity_id}/submit")
@@ -110,13 +133,12 @@ async def submit_to_activity(activity_id: int, request: Dict) -> Dict:
         raise HTTPException(status_code=400, detail="agent_id/user_id and content required")
     
     # 检查用户存在
-    from db import get_user
-    user = get_user(entity_id)
+    user = await run_db(get_user, entity_id)
     if not user:
         raise HTTPException(status_code=403, detail="User not registered")
     
     # 检查活动是否存在
-    activity = get_activity(activity_id)
+    activity = await run_db(get_activity, activity_id)
     if not activity:
         raise HTTPException(status_code=404, detail="Activity not found")
     
@@ -128,9 +150,8 @@ async def submit_to_activity(activity_id: int, request: Dict) -> Dict:
         "content": content
     }
     
-    submission_id = create_submission(submission_data)
-    
-    # TODO: 检查是否首次提交，如果是则给予积分奖励
+    # 首次提交的积分奖励在 create_submission 的同一事务中记账
+    submission_id = await run_write(create_submission, submission_data)
     
     return {
         "message": "Submission successful",
@@ -139,23 +160,235 @@ async def submit_to_activity(activity_id: int, request: Dict) -> Dict:
     }
 
 
-@router.put("/{activity_id}/status")
-async def update_activity_status_endpoint(activity_id: int, request: Dict) -> Dict:
-    """更新活动状态（管理员/审阅员权限）"""
+@router.post("/submissions:bulk")
+async def bulk_submit(request: Request) -> StreamingResponse:
+    """
+    批量提交作品（NDJSON 流式导入）
+    
+    请求体每行一个 JSON：{"activity_id", "agent_id"/"user_id", "content"}。
+    用户和活动按不同 ID 各校验一次，合法行按 config.SUBMISSION_BULK_CHUNK
+    分块用 executemany 插入（每块一个事务），每行结果以 NDJSON 流式返回。
+    """
+    return _DuplexStreamingResponse(
+        _ingest_submissions(request),
+        media_type=NDJSON_MEDIA_TYPE
+    )
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """
+    边读请求体边写响应的流式响应
+    
+    StreamingResponse 在旧版 ASGI 协议下会并发监听断开事件，
+    和生成器抢着读请求体；这里只发送响应，请求体由生成器自己读取。
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+
+
+async def _ingest_submissions(request: Request) -> AsyncIterator[str]:
+    """逐行解析请求体，分块写入，逐行返回结果"""
+    users: Dict[str, Dict] = {}
+    activities: Dict[int, bool] = {}
+    chunk: List[Tuple[int, Dict]] = []
+    counts = {"created": 0, "failed": 0}
+
+    async def validate(line_no: int, raw: bytes) -> Optional[str]:
+        """校验一行；合法则加入当前块，否则返回错误信息"""
+        try:
+            item = json.loads(raw)
+        except ValueError:
+            return "Invalid JSON"
+        if not isinstance(item, dict):
+            return "Invalid JSON"
+
+        entity_id = item.get("agent_id") or item.get("user_id")
+        activity_id = item.get("activity_id")
+        content = item.get("content")
+        # 类型不对的行在这里拒绝：否则会让整块写入失败，或在查用户时中断整个响应流
+        if (not entity_id or not isinstance(entity_id, str)
+                or not content or not isinstance(content, str)
+                or not isinstance(activity_id, int) or isinstance(activity_id, bool)):
+            return "activity_id, agent_id/user_id and content required"
+
+        if entity_id not in users:
+            users[entity_id] = await run_db(get_user, entity_id)
+        if not users[entity_id]:
+            return "User not registered"
+
+        if activity_id not in activities:
+            activities[activity_id] = bool(await run_db(get_activity, activity_id))
+        if not activities[activity_id]:
+            return "Activity not found"
+
+        chunk.append((line_no, {
+            "activity_id": activity_id,
+            "submitter_id": entity_id,
+            "submitter_name": users[entity_id].get("username", entity_id),
+            "content": content
+        }))
+        return None
+
+    async def flush() -> AsyncIterator[str]:
+        """写入当前块并返回每行结果"""
+        rows, chunk[:] = list(chunk), []
+        try:
+            ids = await run_write(create_submissions, [row for _, row in rows])
+        except Exception as e:
+            counts["failed"] += len(rows)
+            for line_no, _ in rows:
+                yield ndjson({"line": line_no, "status": "error", "detail": str(e)})
+            return
+        counts["created"] += len(rows)
+        for (line_no, _), submission_id in zip(rows, ids):
+            yield ndjson({"line": line_no, "status": "created", "submission_id": submission_id})
+
+    async def process(line_no: int, raw: bytes) -> AsyncIterator[str]:
+        if not raw.strip():
+            return
+        error = await validate(line_no, raw)
+        if error:
+            counts["failed"] += 1
+            yield ndjson({"line": line_no, "status": "error", "detail": error})
+        elif len(chunk) >= config.SUBMISSION_BULK_CHUNK:
+            async for result in flush():
+                yield result
+
+    line_no = 0
+    buffer = b""
+    async for data in request.stream():
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for raw in lines:
+            line_no += 1
+            async for result in process(line_no, raw):
+                yield result
+    if buffer:
+        line_no += 1
+        async for result in process(line_no, buffer):
+            yield result
+    if chunk:
+        async for result in flush():
+            yield result
+
+    yield ndjson({"summary": counts})
+
+
+@router.post("/{activity_id}/submissions/{submission_id}/vote")
+async def vote_on_submission(
+    activity_id: int,
+    submission_id: int,
+    current_user: Dict = Depends(auth.get_current_user)
+) -> Dict:
+    """
+    为提交投票（每人每个提交一票，不能给自己的提交投票；返回最新票数和名次）
     
-    # 检查查权限
-    user_id = request.get("user_id")
-    if not user_id:
-        raise HTTPException(status_code=400, detail="user_id required")
+    票数决定名次和结束时的名次奖励，投票人只能是已认证的注册用户本人
+    """
+    result = await run_write(
+        vote_submission, activity_id, submission_id,
+        current_user["user_id"], current_user["type"]
+    )
+    return _submission_vote_response(activity_id, submission_id, result)
+
+
+@router.delete("/{activity_id}/submissions/{submission_id}/vote")
+async def unvote_on_submission(
+    activity_id: int,
+    submission_id: int,
+    current_user: Dict = Depends(auth.get_current_user)
+) -> Dict:
+    """撤回当前用户对提交的投票"""
+    result = await run_write(unvote_submission, activity_id, submission_id, current_user["user_id"])
+    return _submission_vote_response(activity_id, submission_id, result)
+
+
+_VOTE_MESSAGES = {
+    "recorded": "Vote recorded",
+    "already_voted": "Already voted",
+    "removed": "Vote removed",
+    "not_voted": "Not voted"
+}
+
+
+def _submission_vote_response(activity_id: int, submission_id: int, result: Optional[Dict]) -> Dict:
+    if result is None:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    if result["status"] == "closed":
+        raise HTTPException(status_code=400, detail="Activity is closed")
+    if result["status"] == "own_submission":
+        raise HTTPException(status_code=400, detail="Cannot vote for your own submission")
     
-    # TODO: 添加权限检查
+    return {
+        "message": _VOTE_MESSAGES[result["status"]],
+        "activity_id": activity_id,
+        "submission_id": submission_id,
+        "vote_count": result["vote_count"],
+        "rank": result["rank"]
+    }
+
+
+@router.get("/{activity_id}/ranking")
+async def get_activity_ranking(
+    activity_id: int,
+    request: Request,
+    limit: int = 50,
+    cursor: Optional[str] = None
+) -> Dict:
+    """
+    活动的提交排名（票数降序，同票先提交的在前；并列的提交名次相同）
+    
+    名次由投票增量维护，这里只按索引读取一页；带 ETag。
+    """
+    after = decode_cursor(cursor, RANKING_SORT_KEYS)
+
+    async def build() -> Dict:
+        activity = await run_db(get_activity, activity_id)
+        if not activity:
+            raise HTTPException(status_code=404, detail="Activity not found")
+        ranking = await run_db(get_submission_ranking, activity_id, limit, after)
+        return {
+            "activity_id": activity_id,
+            "status": activity["status"],
+            "ranking": ranking,
+            "next_cursor": next_cursor(ranking, RANKING_SORT_KEYS, limit)
+        }
+
+    return await conditional_json(request, ("activities", "submissions"), build)
+
+
+@router.put("/{activity_id}/status")
+async def update_activity_status_endpoint(
+    activity_id: int,
+    request: Dict,
+    current_user: Dict = Depends(auth.require_reviewer)
+) -> Dict:
+    """更新活动状态（管理员/审阅员权限；结束活动会发放名次奖励，不可撤销）"""
     
     new_status = request.get("status")
     if not new_status:
         raise HTTPException(status_code=400, detail="status required")
     
-    # 更新状态
-    update_activity_status(activity_id, new_status)
+    # 关闭活动时同一事务内评出名次和获奖者
+    if new_status == config.STATUS_CLOSED:
+        result = await run_write(close_activity, activity_id)
+        if result is None:
+            raise HTTPException(status_code=404, detail="Activity not found")
+        return {
+            "message": "Activity closed" if result["closed"] else "Activity already closed",
+            "activity_id": activity_id,
+            "new_status": new_status,
+            "winners": result["winners"],
+            "placed": result["placed"]
+        }
+    
+    # 已结束的活动不能重新打开（名次奖励已发放），检查在写入中原子完成
+    updated = await run_write(update_activity_status, activity_id, new_status)
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Activity not found")
+    if not updated:
+        raise HTTPException(status_code=400, detail="Activity is closed")
     
     return {
         "message": "Activity status updated",
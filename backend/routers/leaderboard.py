@@ -0,0 +1,37 @@
+"""
+jungle-board - 排行榜路由
+"""
+
+from fastapi import APIRouter, HTTPException
+from typing import Dict, Optional
+
+import leaderboard
+
+router = APIRouter(prefix="/api/leaderboard", tags=["Leaderboard"])
+
+
+@router.get("/")
+async def get_leaderboard(
+    type: Optional[str] = None,
+    limit: int = 100,
+    offset: int = 0
+) -> Dict:
+    """积分排行榜（type 为 human / ai 时为分类榜，不传为总榜）"""
+    if not leaderboard.has_board(type):
+        raise HTTPException(status_code=400, detail="type must be human or ai")
+    
+    return {
+        "type": type or "all",
+        "leaderboard": leaderboard.top(type, limit=limit, offset=offset)
+    }
+
+
+@router.get("/rank/{user_id}")
+async def get_user_rank(user_id: str) -> Dict:
+    """查询用户在总榜和分类榜中的名次"""
+    result = leaderboard.rank(user_id)
+    
+    if result is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    return result
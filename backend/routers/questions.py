@@ -2,7 +2,7 @@
 jungle-board - 问题管理路由
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from datetime import datetime
 from typing import Dict, Optional
 import json
@@ -10,62 +10,67 @@ import json
 import config
 import auth
 from db import (
-    get_question, create_question, list_questions,
-    increment_question_views, increment_question_votes,
+    get_question, post_question, list_questions,
     update_question_status, get_today_question_count,
-    has_voted, create_vote
+    cast_vote, cast_votes, count_rows, run_db, iter_questions, QUESTION_SORT_KEYS
 )
+from writer import run_write
+from buffers import question_views
+from pagination import decode_cursor, next_cursor
+from streaming import ndjson_response
+from http_cache import conditional_json
 
 router = APIRouter(prefix="/api/questions", tags=["Questions"])
 
 
-def calculate_heat(question: Dict) -> int:
-    """计算问题热度"""
-    views = question.get("views", 0)
-    votes = question.get("votes", 0)
-    
-    # 解析 participants JSON
-    participants_str = question.get("participants", "[]")
-    try:
-        participants = json.loads(participants_str) if isinstance(participants_str, str) else participants_str
-    except:
-        participants = []
-    
-    participants_count = len(participants) if isinstance(participants, list) else 0
-    
-    return views * 1 + votes * 5 + participants_count * 10
-
-
 @router.get("/")
 async def get_all_questions(
+    request: Request,
     status: Optional[str] = None,
     limit: int = 100,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    stream: bool = False
 ) -> Dict:
-    """获取所有问题列表"""
-    questions = list_questions(status=status, limit=limit, offset=offset)
-    
-    # 计算每个问题的热度
-    for q in questions:
-        q["heat"] = calculate_heat(q)
-    
-    return {"questions": questions, "total": len(questions)}
+    """
+    获取所有问题列表（cursor 为上一页返回的 next_cursor，优先于 offset）
+    
+    stream=true 时以 NDJSON 逐行流式返回问题，不含 total 和 next_cursor；
+    否则带 ETag，问题表未修改时 If-None-Match 返回 304。
+    """
+    after = decode_cursor(cursor, QUESTION_SORT_KEYS)
+    if stream:
+        return ndjson_response(iter_questions(
+            status=status, limit=limit, offset=0 if after else offset, after=after
+        ))
+
+    async def build() -> Dict:
+        questions = await run_db(
+            list_questions, status=status, limit=limit,
+            offset=0 if after else offset, after=after
+        )
+        total = await run_db(count_rows, "questions", {"status": status})
+        return {
+            "questions": questions,
+            "total": total,
+            "next_cursor": next_cursor(questions, QUESTION_SORT_KEYS, limit)
+        }
+
+    return await conditional_json(request, ("questions",), build)
 
 
 @router.get("/{question_id}")
 async def get_single_question(question_id: int) -> Dict:
     """获取单个问题详情"""
-    question = get_question(question_id)
+    question = await run_db(get_question, question_id)
     
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
     
-    # 增加浏览次数
-    increment_question_views(question_id)
-    question["views"] += 1
-    
-    # 计算热度
-    question["heat"] = calculate_heat(question)
+    # 增加浏览次数（写回缓冲，批量落库；返回值含尚未落库的浏览）
+    unflushed_views = question_views.add(question_id)
+    question["views"] += unflushed_views
+    question["heat"] += unflushed_views * config.HEAT_WEIGHT_VIEW
     
     return question
 
@@ -80,13 +85,10 @@ async def create_new_question(
     entity_id = current_user["user_id"]
     entity_type = current_user["type"]
     
-    # 检查今天是否超过限制
-    today_count = get_today_question_count(entity_id)
+    # 检查今天是否超过限制（快速拒绝；真正的占用在创建问题的事务中原子完成）
+    today_count = await run_db(get_today_question_count, entity_id)
     if today_count >= config.MAX_QUESTIONS_PER_DAY:
-        raise HTTPException(
-            status_code=429,
-            detail=f"Daily limit reached: {today_count}/{config.MAX_QUESTIONS_PER_DAY} questions per day"
-        )
+        raise _daily_limit_reached()
     
     # 创建问题
     question_data = {
@@ -100,12 +102,10 @@ async def create_new_question(
         "status": config.STATUS_PENDING,
         "views": 0,
         "votes": 0,
-        "participants": "[]",
+        "participants": 0,
         "heat": 0
     }
     
-    question_id = create_question(question_data)
-    
     # 扣除积分
     difficulty = request.get("difficulty", config.DIFFICULTY_MEDIUM)
     if difficulty == config.DIFFICULTY_EASY:
@@ -115,17 +115,28 @@ async def create_new_question(
     else:
         points = config.POINTS_POST_QUESTION_MEDIUM
     
-    # TODO: 更新用户积分和创建操作日志
+    # 占用配额、创建问题、扣除积分并记录操作日志（同一事务）
+    result = await run_write(post_question, question_data, points)
+    if result is None:
+        raise _daily_limit_reached()
     
     return {
         "message": "Question created successfully",
-        "question_id": question_id,
-        "questions_today": today_count + 1,
+        "question_id": result["question_id"],
+        "questions_today": result["questions_today"],
         "max_per_day": config.MAX_QUESTIONS_PER_DAY,
         "points_deducted": points
     }
 
 
+def _daily_limit_reached() -> HTTPException:
+    limit = config.MAX_QUESTIONS_PER_DAY
+    return HTTPException(
+        status_code=429,
+        detail=f"Daily limit reached: {limit}/{limit} questions per day"
+    )
+
+
 @router.post("/{question_id}/vote")
 async def vote_on_question(question_id: int, request: Dict) -> Dict:
     """为问题投票"""
@@ -136,43 +147,64 @@ async def vote_on_question(question_id: int, request: Dict) -> Dict:
     if not entity_id:
         raise HTTPException(status_code=400, detail="agent_id or user_id required")
     
-    # 检查问题是否存在
-    question = get_question(question_id)
-    if not question:
+    entity_type = config.TYPE_AI if request.get("agent_id") else config.TYPE_HUMAN
+    
+    # 投票（单事务：插入投票记录 + 累加投票数和热度）
+    result = await run_write(cast_vote, question_id, entity_id, entity_type)
+    if result is None:
         raise HTTPException(status_code=404, detail="Question not found")
     
-    # 检查是否已投票
-    if has_voted(question_id, entity_id):
+    if not result["recorded"]:
         return {
             "message": "Already voted",
             "question_id": question_id,
-            "current_votes": question.get("votes", 0)
+            "current_votes": result["votes"]
         }
     
-    # 创建投票记录
-    entity_type = config.TYPE_AI if request.get("agent_id") else config.TYPE_HUMAN
-    
-    vote_data = {
+    return {
+        "message": "Vote recorded",
         "question_id": question_id,
-        "entity_id": entity_id,
-        "entity_type": entity_type,
-        "vote": True
+        "current_votes": result["votes"],
+        "heat": result["heat"] + question_views.unflushed(question_id) * config.HEAT_WEIGHT_VIEW
     }
+
+
+@router.post("/votes:batch")
+async def vote_on_questions_batch(request: Dict) -> Dict:
+    """
+    批量投票（一个请求、一个事务）
+    
+    每个问题返回 recorded / already_voted / not_found。
+    """
+    
+    # 检查身份
+    entity_id = request.get("agent_id") or request.get("user_id")
+    
+    if not entity_id:
+        raise HTTPException(status_code=400, detail="agent_id or user_id required")
     
-    create_vote(vote_data)
+    question_ids = request.get("question_ids")
+    if not isinstance(question_ids, list) or not question_ids:
+        raise HTTPException(status_code=400, detail="question_ids required")
+    if len(question_ids) > config.MAX_BATCH_VOTES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many questions: at most {config.MAX_BATCH_VOTES} per batch"
+        )
+    if not all(isinstance(qid, int) and not isinstance(qid, bool) for qid in question_ids):
+        raise HTTPException(status_code=400, detail="question_ids must be integers")
     
-    # 增加投票数
-    increment_question_votes(question_id)
+    entity_type = config.TYPE_AI if request.get("agent_id") else config.TYPE_HUMAN
     
-    # 重新获取问题（带更新后的投票数）
-    question = get_question(question_id)
-    heat = calculate_heat(question)
+    results = await run_write(cast_votes, question_ids, entity_id, entity_type)
+    for result in results:
+        if "heat" in result:
+            result["heat"] += question_views.unflushed(result["question_id"]) * config.HEAT_WEIGHT_VIEW
     
     return {
-        "message": "Vote recorded",
-        "question_id": question_id,
-        "current_votes": question.get("votes", 0),
-        "heat": heat
+        "message": "Batch vote processed",
+        "recorded": sum(1 for r in results if r["status"] == "recorded"),
+        "results": results
     }
 
 
@@ -193,7 +225,7 @@ async def update_question_status_endpoint(question_id: int, request: Dict) -> Di
         raise HTTPException(status_code=400, detail="status required")
     
     # 更新状态
-    update_question_status(question_id, new_status)
+    await run_write(update_question_status, question_id, new_status)
     
     return {
         "message": "Question status updated",
@@ -0,0 +1,44 @@
+"""
+jungle-board - 智能推荐路由
+"""
+
+from fastapi import APIRouter, HTTPException
+from typing import Dict, Optional
+
+import config
+import matching
+from db import run_db
+
+router = APIRouter(prefix="/api/recommendations", tags=["Recommendations"])
+
+
+@router.get("/{user_id}")
+async def get_recommendations(
+    user_id: str,
+    limit: int = 10,
+    type: Optional[str] = None
+) -> Dict:
+    """
+    按匹配度为用户推荐待解决的问题和进行中的活动
+    
+    type 限定 question / activity；已提交过的活动不再推荐。
+    """
+    if type is not None and type not in matching.KIND_TABLES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"type must be one of: {', '.join(matching.KIND_TABLES)}"
+        )
+    if not 1 <= limit <= config.RECOMMENDATION_MAX_LIMIT:
+        raise HTTPException(
+            status_code=400,
+            detail=f"limit must be between 1 and {config.RECOMMENDATION_MAX_LIMIT}"
+        )
+    
+    recommendations = await run_db(matching.recommend, user_id, limit, type)
+    if recommendations is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    return {
+        "user_id": user_id,
+        "recommendations": recommendations
+    }
@@ -0,0 +1,66 @@
+"""
+jungle-board - 全文搜索路由
+"""
+
+from fastapi import APIRouter, HTTPException, Request
+from typing import Dict, Optional
+
+from db import search, fts_query, run_db, SEARCH_SOURCES, SEARCH_SORT_KEYS, SEARCH_MIN_TERM_LENGTH
+from pagination import decode_cursor, next_cursor
+from http_cache import conditional_json
+
+router = APIRouter(prefix="/api/search", tags=["Search"])
+
+
+@router.get("/")
+async def search_all(
+    request: Request,
+    q: str,
+    type: Optional[str] = None,
+    status: Optional[str] = None,
+    category: Optional[str] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None
+) -> Dict:
+    """
+    全文搜索问题、活动和技能（按相关度排序）
+    
+    type 限定 question / activity / skill；status 筛选问题和活动，
+    category 筛选技能。cursor 为上一页返回的 next_cursor。
+    """
+    match = fts_query(q)
+    if match is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Each search term must be at least {SEARCH_MIN_TERM_LENGTH} characters"
+        )
+    if type is not None and type not in SEARCH_SOURCES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"type must be one of: {', '.join(SEARCH_SOURCES)}"
+        )
+    
+    types = (type,) if type else tuple(SEARCH_SOURCES)
+    filters = {k: v for k, v in (("status", status), ("category", category)) if v is not None}
+    # 每个类型只有一个筛选列：没有类型适用全部筛选时报错，而不是返回空结果
+    if type is not None:
+        invalid = [column for column in filters if column != SEARCH_SOURCES[type][3]]
+        if invalid:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{invalid[0]} cannot be used with type={type}"
+            )
+    elif len(filters) > 1:
+        raise HTTPException(status_code=400, detail="status and category cannot be combined")
+    after = decode_cursor(cursor, SEARCH_SORT_KEYS)
+
+    async def build() -> Dict:
+        results = await run_db(search, match, types, filters, limit, after)
+        return {
+            "results": results,
+            "next_cursor": next_cursor(results, SEARCH_SORT_KEYS, limit)
+        }
+
+    return await conditional_json(
+        request, [SEARCH_SOURCES[t][0] for t in types], build
+    )
@@ -2,35 +2,72 @@
 jungle-board - 技能管理路由
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from typing import Dict, Optional
 
 import config
-from db import get_skill, create_skill, list_skills
+from db import (
+    get_skill, create_skill, list_skills, iter_skills, get_user, count_rows, run_db,
+    record_skill_rating, SKILL_SORT_KEYS
+)
+from buffers import skill_downloads
+from writer import run_write
+from pagination import decode_cursor, next_cursor
+from streaming import ndjson_response
+from http_cache import conditional_json
 
 router = APIRouter(prefix="/api/skills", tags=["Skills"])
 
 
 @router.get("/")
 async def get_all_skills(
+    request: Request,
     category: Optional[str] = None,
     limit: int = 100,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    stream: bool = False
 ) -> Dict:
-    """获取所有技能列表"""
-    skills = list_skills(category=category, limit=limit, offset=offset)
-    return {"skills": skills, "total": len(skills)}
+    """
+    获取所有技能列表（cursor 为上一页返回的 next_cursor，优先于 offset）
+    
+    stream=true 时以 NDJSON 逐行流式返回技能，不含 total 和 next_cursor；
+    否则带 ETag，技能表未修改时 If-None-Match 返回 304。
+    """
+    after = decode_cursor(cursor, SKILL_SORT_KEYS)
+    if stream:
+        return ndjson_response(iter_skills(
+            category=category, limit=limit, offset=0 if after else offset, after=after
+        ))
+
+    async def build() -> Dict:
+        skills = await run_db(
+            list_skills, category=category, limit=limit,
+            offset=0 if after else offset, after=after
+        )
+        total = await run_db(count_rows, "skills", {"category": category})
+        return {
+            "skills": skills,
+            "total": total,
+            "next_cursor": next_cursor(skills, SKILL_SORT_KEYS, limit)
+        }
+
+    return await conditional_json(request, ("skills",), build)
 
 
 @router.get("/{skill_id}")
-async def get_single_skill(skill_id: int) -> Dict:
-    """获取单个技能详情"""
-    skill = get_skill(skill_id)
-    
-    if not skill:
-        raise HTTPException(status_code=404, detail="Skill not found")
-    
-    return skill
+async def get_single_skill(skill_id: int, request: Request) -> Dict:
+    """获取单个技能详情（带 ETag）"""
+
+    async def build() -> Dict:
+        skill = await run_db(get_skill, skill_id)
+        
+        if not skill:
+            raise HTTPException(status_code=404, detail="Skill not found")
+        
+        return skill
+
+    return await conditional_json(request, ("skills",), build)
 
 
 @router.post("/")
@@ -44,8 +81,7 @@ async def create_new_skill(request: Dict) -> Dict:
         raise HTTPException(status_code=400, detail="agent_id or user_id required")
     
     # 检查用户存在
-    from db import get_user
-    user = get_user(entity_id)
+    user = await run_db(get_user, entity_id)
     if not user:
         raise HTTPException(status_code=403, detail="User not registered")
     
@@ -59,7 +95,7 @@ async def create_new_skill(request: Dict) -> Dict:
         "author_name": user.get("username", entity_id)
     }
     
-    skill_id = create_skill(skill_data)
+    skill_id = await run_write(create_skill, skill_data)
     
     return {
 "message": "Skill created successfully",
@@ -69,7 +105,11 @@ async def create_new_skill(request: Dict) -> Dict:
 
 @router.post("/{skill_id}/download")
 async def download_skill(skill_id: int, request: Dict) -> Dict:
-    """下载技能"""
+    """
+    下载技能
+    
+    下载记录经缓冲批量落库；同一用户在去重窗口内重复下载只计一次（counted 为 false）。
+    """
     
     # 检查身份
     entity_id = request.get("agent_id") or request.get("user_id")
@@ -78,23 +118,24 @@ async def download_skill(skill_id: int, request: Dict) -> Dict:
         raise HTTPException(status_code=400, detail="agent_id or user_id required")
     
     # 检查技能是否存在
-    skill = get_skill(skill_id)
+    skill = await run_db(get_skill, skill_id)
     if not skill:
         raise HTTPException(status_code=404, detail="Skill not found")
     
-    # TODO: 创建下载记录
-    # TODO: 增加技能下载次数
+    counted = skill_downloads.add(skill_id, entity_id)
     
     return {
         "message": "Download successful",
         "skill_id": skill_id,
-        "skill_name": skill.get("name")
+        "skill_name": skill.get("name"),
+        "downloads": skill["downloads"] + skill_downloads.unflushed(skill_id),
+        "counted": counted
     }
 
 
 @router.post("/{skill_id}/rate")
 async def rate_skill(skill_id: int, request: Dict) -> Dict:
-    """为技能评分"""
+    """为技能评分（再次评分会替换之前的评分）"""
     
     # 检查身份
     entity_id = request.get("agent_id") or request.get("user_id")
@@ -103,17 +144,26 @@ async def rate_skill(skill_id: int, request: Dict) -> Dict:
     if not entity_id or not rating:
         raise HTTPException(status_code=400, detail="agent_id/user_id and rating required")
     
-    # 检查技能是否存在
-    skill = get_skill(skill_id)
-    if not skill:
+    if (
+        not isinstance(rating, int) or isinstance(rating, bool)
+        or not config.SKILL_RATING_MIN <= rating <= config.SKILL_RATING_MAX
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail=f"rating must be an integer from {config.SKILL_RATING_MIN} to {config.SKILL_RATING_MAX}"
+        )
+    
+    result = await run_write(
+        record_skill_rating, skill_id, entity_id, rating, request.get("comment")
+    )
+    if result is None:
         raise HTTPException(status_code=404, detail="Skill not found")
     
-    # TODO: 检查是否已评分
-    # TODO: 创建评分记录
-    # TODO: 重新计算平均评分
-    
     return {
         "message": "Rating recorded",
         "skill_id": skill_id,
-        "rating": rating
+        "rating": rating,
+        "average_rating": result["rating"],
+        "rating_count": result["rating_count"],
+        "rank_score": result["rank_score"]
     }
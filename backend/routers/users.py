@@ -5,11 +5,19 @@ jungle-board - 用户管理路由
 from fastapi import APIRouter, HTTPException, Depends
 from datetime import datetime
 from typing import Dict, Optional
+import json
 import random
 import string
 
 import config
-from db import get_user, create_user, update_user_score, list_users
+import matching
+from db import (
+    get_user, register_new_user, update_user_score, update_client_secret, list_users,
+    verify_points_balance, rebuild_points_balance, count_rows, run_db, USER_SORT_KEYS
+)
+from writer import run_write
+from pagination import decode_cursor, next_cursor
+from http_cache import json_response
 import auth
 
 router = APIRouter(prefix="/api/users", tags=["Users"])
@@ -25,7 +33,7 @@ async def register_human_user(request: Dict) -> Dict:
         raise HTTPException(status_code=400, detail="user_id and github_token required")
     
     # 检查是否已注册
-    existing_user = get_user(user_id)
+    existing_user = await run_db(get_user, user_id)
     if existing_user:
         # 生成新的 JWT token
         token = auth.create_access_token(user_id, config.TYPE_HUMAN)
@@ -46,7 +54,8 @@ async def register_human_user(request: Dict) -> Dict:
         "score": 0
     }
     
-    create_user(user_data)
+    # 创建用户并发放注册奖励（同一事务）
+    await run_write(register_new_user, user_data)
     
     # 生成 JWT token
     token = auth.create_access_token(user_id, config.TYPE_HUMAN)
@@ -67,12 +76,18 @@ async def register_ai_user(request: Dict) -> Dict:
     
     需要管理员权限
     返回 client_id 和 client_secret
+    可选的 capabilities 用于智能推荐（见 matching.parse_capabilities）
     """
+    try:
+        capabilities = matching.parse_capabilities(request.get("capabilities"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     client_id = request.get("client_id") or f"ai-{random_string(16)}"
     client_secret = random_string(32)
     
     # 检查是否已注册
-    existing_user = get_user(client_id)
+    existing_user = await run_db(get_user, client_id)
     if existing_user:
         raise HTTPException(status_code=400, detail="AI client_id already exists")
     
@@ -84,19 +99,62 @@ async def register_ai_user(request: Dict) -> Dict:
         "username": request.get("username", client_id),
         "client_id": client_id,
         "client_secret_hash": auth.hash_secret(client_secret),
-        "score": 0
+        "score": 0,
+        "capabilities": json.dumps(capabilities, ensure_ascii=False)
     }
     
-    create_user(user_data)
+    # 创建用户并发放注册奖励（同一事务）
+    await run_write(register_new_user, user_data)
     
     return {
         "message": "AI user registered",
         "client_id": client_id,
         "client_secret": client_secret,  # 只显示一次，保存后不显示
+        "warning": "Save the client_secret, it will not be shown again",
+        "points": config.POINTS_REGISTRATION
+    }
+
+
+@router.post("/ai/{ai_client_id}/rotate")
+async def rotate_ai_secret(
+    ai_client_id: str,
+    current_user: Dict = Depends(auth.require_admin)
+) -> Dict:
+    """轮换 AI 客户端 secret（管理员操作，旧 secret 立即失效）"""
+    client_secret = random_string(32)
+    
+    updated = await run_write(update_client_secret, ai_client_id, auth.hash_secret(client_secret))
+    if not updated:
+        raise HTTPException(status_code=404, detail="AI client not found")
+    
+    auth.invalidate_ai_credentials(ai_client_id)
+    
+    return {
+        "message": "AI client secret rotated",
+        "client_id": ai_client_id,
+        "client_secret": client_secret,  # 只显示一次，保存后不显示
         "warning": "Save the client_secret, it will not be shown again"
     }
 
 
+@router.post("/ai/{ai_client_id}/revoke")
+async def revoke_ai_secret(
+    ai_client_id: str,
+    current_user: Dict = Depends(auth.require_admin)
+) -> Dict:
+    """吊销 AI 客户端凭证（管理员操作）"""
+    updated = await run_write(update_client_secret, ai_client_id, None)
+    if not updated:
+        raise HTTPException(status_code=404, detail="AI client not found")
+    
+    auth.invalidate_ai_credentials(ai_client_id)
+    
+    return {
+        "message": "AI client credentials revoked",
+        "client_id": ai_client_id
+    }
+
+
 def random_string(length: int) -> str:
     """生成随机字符串"""
     return ''.join(random.choices(string.ascii_lowercase + string.digits, k=length))
@@ -105,7 +163,7 @@ def random_string(length: int) -> str:
 @router.get("/{user_id}")
 async def get_user_profile(user_id: str) -> Dict:
     """获取用户档案"""
-    user = get_user(user_id)
+    user = await run_db(get_user, user_id)
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -116,17 +174,26 @@ async def get_user_profile(user_id: str) -> Dict:
 @router.get("/")
 async def list_all_users(
     limit: int = 100,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None
 ) -> Dict:
-    """列出所有用户（分页）"""
-    users = list_users(limit=limit, offset=offset)
-    return {"users": users, "total": len(users)}
+    """列出所有用户（分页；cursor 为上一页返回的 next_cursor，优先于 offset）"""
+    after = decode_cursor(cursor, USER_SORT_KEYS)
+    users = await run_db(
+        list_users, limit=limit, offset=0 if after else offset, after=after
+    )
+    total = await run_db(count_rows, "users")
+    return json_response({
+        "users": users,
+        "total": total,
+        "next_cursor": next_cursor(users, USER_SORT_KEYS, limit)
+    })
 
 
 @router.put("/{user_id}/score")
 async def update_score(user_id: str, request: Dict) -> Dict:
-    """更新用户积分"""
-    user = get_user(user_id)
+    """更新用户积分（与当前积分的差额记入积分账本）"""
+    user = await run_db(get_user, user_id)
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -135,10 +202,39 @@ async def update_score(user_id: str, request: Dict) -> Dict:
     if new_score is None:
         raise HTTPException(status_code=400, detail="score required")
     
-    update_user_score(user_id, new_score)
+    await run_write(update_user_score, user_id, new_score)
     
     return {
         "message": "Score updated",
         "user_id": user_id,
         "new_score": new_score
     }
+
+
+@router.get("/{user_id}/balance")
+async def get_points_balance(user_id: str) -> Dict:
+    """核对用户积分与积分账本（最近检查点 + 之后的记录）是否一致"""
+    result = await run_db(verify_points_balance, user_id)
+    
+    if result is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    return result
+
+
+@router.post("/{user_id}/balance/rebuild")
+async def rebuild_balance(
+    user_id: str,
+    current_user: Dict = Depends(auth.require_admin)
+) -> Dict:
+    """按积分账本重建用户积分（需要管理员权限）"""
+    balance = await run_write(rebuild_points_balance, user_id)
+    
+    if balance is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    return {
+        "message": "Balance rebuilt",
+        "user_id": user_id,
+        "score": balance
+    }
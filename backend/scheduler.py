@@ -0,0 +1,87 @@
+"""
+jungle-board - 定时任务模块
+
+进程内调度：每天 config.DAILY_ACTIVITY_HOUR:MINUTE（服务器本地时间）
+把热度最高的待解决问题转为当天的活动（docs/game_rules.md 每日活动）；
+另外每隔 config.LEADERBOARD_SYNC_INTERVAL 秒把其他进程的积分变更同步到
+本进程的排行榜。
+
+多个工作进程都会运行这个任务，靠 scheduled_runs 表的 (job, run_date)
+主键保证每天只执行一次（见 db.create_daily_activities）。
+启动时如果已过当天的执行时间且当天还没执行过，会立即补执行。
+"""
+
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+import config
+import db
+import leaderboard
+import metrics
+from writer import run_write
+
+DAILY_ACTIVITY_JOB = "daily_activity"
+
+
+async def run_daily_activity(run_date: date) -> Optional[List[int]]:
+    """执行一次每日活动任务，返回新活动 ID；当天已执行过时返回 None"""
+    start = time.perf_counter()
+    try:
+        activity_ids = await run_write(
+            db.create_daily_activities,
+            DAILY_ACTIVITY_JOB, run_date.isoformat(), config.DAILY_ACTIVITY_COUNT
+        )
+    except Exception:
+        metrics.incr("scheduler_daily_activity_failures")
+        raise
+
+    if activity_ids is None:
+        metrics.incr("scheduler_daily_activity_skipped")
+    else:
+        metrics.incr("scheduler_daily_activity_runs")
+        metrics.observe("scheduler_daily_activity_seconds", time.perf_counter() - start)
+        metrics.observe("scheduler_daily_activity_created", len(activity_ids))
+    return activity_ids
+
+
+def _next_run(now: datetime) -> datetime:
+    """now 之后的下一个执行时间"""
+    run_at = now.replace(
+        hour=config.DAILY_ACTIVITY_HOUR, minute=config.DAILY_ACTIVITY_MINUTE,
+        second=0, microsecond=0
+    )
+    return run_at if run_at > now else run_at + timedelta(days=1)
+
+
+async def run_daily_activity_periodic() -> None:
+    """每日活动调度（后台任务）"""
+    now = datetime.now()
+    if _next_run(now).date() > now.date():
+        # 今天的执行时间已过：补执行（已执行过则跳过）
+        try:
+            await run_daily_activity(now.date())
+        except Exception:
+            pass
+
+    while True:
+        run_at = _next_run(datetime.now())
+        await asyncio.sleep((run_at - datetime.now()).total_seconds())
+        try:
+            await run_daily_activity(run_at.date())
+        except Exception:
+            # 失败已计入 metrics，占位随事务回滚，明天照常执行
+            pass
+
+
+async def run_leaderboard_sync_periodic(interval: float) -> None:
+    """排行榜对账（后台任务）：加载水位之后有变更的用户并合并"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            users = await db.run_db(db.list_user_scores, leaderboard.watermark())
+        except Exception:
+            metrics.incr("leaderboard_sync_failures")
+            continue
+        metrics.observe("leaderboard_sync_changed", leaderboard.sync(users))
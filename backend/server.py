@@ -3,33 +3,84 @@ jungle-board - 人机平等协作的问题解决平台
 主服务器文件 - 集成所有路由
 """
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
+from contextlib import asynccontextmanager
+import asyncio
 import os
+import time
 
 # 导入配置
 import config
 
 # 导入数据库模块
 import db
+import metrics
+import writer
+import buffers
+import leaderboard
+import matching
+import scheduler
 
 # 导入路由
-from routers import users, questions, activities, skills
+from routers import users, questions, activities, skills, search, recommendations, leaderboard as leaderboard_router
+
+# ==================== 生命周期 ====================
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动写入线程、加载排行榜和匹配矩阵、启动后台任务，关闭时落库缓冲并释放数据库连接"""
+    writer.start()
+    leaderboard.load(await db.run_db(db.list_user_scores))
+    await db.run_db(matching.refresh)
+    tasks = [
+        asyncio.create_task(metrics.monitor_event_loop_lag(config.LOOP_LAG_INTERVAL)),
+        asyncio.create_task(buffers.question_views.run_periodic(config.VIEW_FLUSH_INTERVAL)),
+        asyncio.create_task(buffers.skill_downloads.run_periodic(config.SKILL_DOWNLOAD_FLUSH_INTERVAL)),
+        asyncio.create_task(scheduler.run_daily_activity_periodic()),
+        asyncio.create_task(scheduler.run_leaderboard_sync_periodic(config.LEADERBOARD_SYNC_INTERVAL))
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+    buffers.question_views.flush()
+    buffers.skill_downloads.flush()
+    writer.stop()
+    db.close_db()
+
+
 
 # 创建应用
 app = FastAPI(
     title="jungle-board API",
     version="4.0.0",
-    description="人机平等协作的问题解决平台"
+    description="人机平等协作的问题解决平台",
+    lifespan=lifespan
 )
 
+# ==================== 请求耗时 ====================
+
+@app.middleware("http")
+async def record_route_timing(request: Request, call_next):
+    """按路由模板记录请求耗时"""
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    path = route.path if route is not None else "<unmatched>"
+    metrics.observe_route(f"{request.method} {path}", time.perf_counter() - start)
+    return response
+
+
 # ==================== 挂载路由 ====================
 
 app.include_router(users.router)
 app.include_router(questions.router)
 app.include_router(activities.router)
 app.include_router(skills.router)
+app.include_router(leaderboard_router.router)
+app.include_router(search.router)
+app.include_router(recommendations.router)
 
 # ==================== 挂载静态文件 ====================
 
@@ -69,6 +120,12 @@ async def health_check():
     }
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """运行指标（路由耗时、事件循环延迟等）"""
+    return metrics.snapshot()
+
+
 # ==================== 兼容性路由（旧 API） ====================
 
 @app.post("/api/register")
@@ -0,0 +1,47 @@
+"""
+jungle-board - 流式响应模块
+
+大列表和导出按 NDJSON（每行一个 JSON）边查边发：数据库游标每次只取一批行，
+序列化后立即写入响应，内存占用不随 limit 或提交内容大小增长。
+"""
+
+import json
+from typing import AsyncIterator, Dict, Iterator, List
+
+from fastapi.responses import StreamingResponse
+
+import metrics
+import models
+from db import run_db
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def ndjson(item: Dict) -> str:
+    """序列化为一行 NDJSON"""
+    return json.dumps(item, ensure_ascii=False) + "\n"
+
+
+async def _stream_batches(batches: Iterator[List]) -> AsyncIterator[bytes]:
+    """逐批取出（在数据库线程池中执行），每批序列化为一个响应块"""
+    rows = 0
+    try:
+        while True:
+            batch = await run_db(next, batches, None)
+            if batch is None:
+                break
+            rows += len(batch)
+            yield models.encode_lines(batch)
+    finally:
+        try:
+            batches.close()
+        except ValueError:
+            # 客户端断开时生成器可能仍在线程中执行，
+            # 执行完后没有引用，由垃圾回收关闭连接
+            pass
+        metrics.observe("stream_rows", rows)
+
+
+def ndjson_response(batches: Iterator[List]) -> StreamingResponse:
+    """把 db.iter_* 返回的分批结果包装为 NDJSON 流式响应"""
+    return StreamingResponse(_stream_batches(batches), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,150 @@
+"""
+jungle-board - 单写入线程模块
+
+所有写操作进入同一个队列，由一个专用线程按批执行：
+一批写操作共享一个事务（组提交），每个写操作包在独立的保存点里，
+失败只影响它自己。结果通过 Future 返回给调用方。
+
+SQLite 同一时刻只允许一个写事务，多个连接抢写锁会出现
+"database is locked"；统一由一个线程写入就不再有写锁竞争。
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+import config
+import db
+import metrics
+
+_STOP = object()
+
+WriteOp = Tuple[Future, Callable, tuple, dict]
+
+
+class WriteQueue:
+    """单写入线程 + 组提交"""
+
+    def __init__(self, max_batch: int, max_delay: float):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """启动写入线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="jungle-writer", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self) -> None:
+        """处理完已排队的写操作后停止写入线程"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """提交写操作，返回 Future"""
+        self.start()
+        future: Future = Future()
+        self._queue.put((future, func, args, kwargs))
+        metrics.set_gauge("writer_queue_depth", self._queue.qsize())
+        return future
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch: List[WriteOp] = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    if timeout > 0:
+                        item = self._queue.get(timeout=timeout)
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            metrics.set_gauge("writer_queue_depth", self._queue.qsize())
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch: List[WriteOp]) -> None:
+        """在一个事务中执行一批写操作"""
+        start = time.perf_counter()
+        results = []
+
+        try:
+            with db.get_db() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for future, func, args, kwargs in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with db.savepoint(conn):
+                            results.append((future, True, func(*args, **kwargs)))
+                    except Exception as e:
+                        results.append((future, False, e))
+        except Exception as e:
+            # 提交失败：整批写操作都没有生效
+            metrics.incr("writer_failed_commits")
+            for future, _, _, _ in batch:
+                if future.running():
+                    future.set_exception(e)
+            return
+
+        for future, ok, value in results:
+            if ok:
+                future.set_result(value)
+            else:
+                metrics.incr("writer_failed_ops")
+                future.set_exception(value)
+
+        metrics.incr("writer_ops", len(batch))
+        metrics.observe("writer_batch_size", len(batch))
+        metrics.observe("writer_commit_seconds", time.perf_counter() - start)
+
+
+_writer = WriteQueue(config.WRITER_MAX_BATCH, config.WRITER_MAX_DELAY)
+
+
+def start() -> None:
+    """启动写入线程"""
+    _writer.start()
+
+
+def stop() -> None:
+    """停止写入线程"""
+    _writer.stop()
+
+
+def submit_write(func: Callable, *args, **kwargs) -> Future:
+    """提交写操作（同步调用方使用）"""
+    return _writer.submit(func, *args, **kwargs)
+
+
+async def run_write(func: Callable, *args, **kwargs) -> Any:
+    """
+    由写入线程执行写操作并等待结果
+
+    func 是 db 模块中的写函数，它内部的 get_db() 会复用
+    写入线程当前批次的连接和事务。
+    """
+    return await asyncio.wrap_future(_writer.submit(func, *args, **kwargs))
@@ -80,10 +80,15 @@ def create_users_table(conn):
             client_id TEXT UNIQUE,
             client_secret_hash TEXT,
             score INTEGER DEFAULT 0,
+            capabilities TEXT DEFAULT '{}',
             created_at TEXT DEFAULT CURRENT_TIMESTAMP,
             updated_at TEXT DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(users)')}
+    if 'capabilities' not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN capabilities TEXT DEFAULT '{}'")
+        print("✅ Added users.capabilities column")
     print("✅ Created users table")
 
 def create_questions_table(conn):
@@ -126,13 +131,30 @@ def create_activities_table(conn):
             difficulty TEXT,
             
             status TEXT DEFAULT 'open',
+            participants_count INTEGER DEFAULT 0,
             
             created_at TEXT DEFAULT CURRENT_TIMESTAMP,
             updated_at TEXT DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(activities)')}
+    if 'participants_count' not in columns:
+        conn.execute('ALTER TABLE activities ADD COLUMN participants_count INTEGER DEFAULT 0')
+        print("✅ Added activities.participants_count column")
     print("✅ Created activities table")
 
+def create_participants_table(conn):
+    """创建 participants 表 - 活动参与者（每人每个活动一行）"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS participants (
+            activity_id INTEGER NOT NULL,
+            entity_id TEXT NOT NULL,
+            joined_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (activity_id, entity_id)
+        ) WITHOUT ROWID
+    ''')
+    print("✅ Created participants table")
+
 def create_submissions_table(conn):
     """创建 submissions 表 - 方案提交（改进版 v2.0）"""
     conn.execute('''
@@ -200,11 +222,16 @@ def create_skills_table(conn):
             downloads INTEGER DEFAULT 0,
             rating REAL DEFAULT 0.0,
             rating_count INTEGER DEFAULT 0,
+            rank_score REAL DEFAULT 3.0,    -- 无评分时为先验平均分（SKILL_RATING_PRIOR_MEAN）
             
             created_at TEXT DEFAULT CURRENT_TIMESTAMP,
             updated_at TEXT DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(skills)')}
+    if 'rank_score' not in columns:
+        conn.execute('ALTER TABLE skills ADD COLUMN rank_score REAL DEFAULT 3.0')
+        print("✅ Added skills.rank_score column")
     print("✅ Created skills table")
 
 def create_skill_downloads_table(conn):
@@ -228,7 +255,8 @@ def create_skill_ratings_table(conn):
             rater_id TEXT NOT NULL,
             rating INTEGER NOT NULL,
             comment TEXT,
-            rated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            rated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(skill_id, rater_id)
         )
     ''')
     print("✅ Created skill_ratings table")
@@ -249,6 +277,51 @@ def create_user_actions_table(conn):
     ''')
     print("✅ Created user_actions table")
 
+def create_points_checkpoints_table(conn):
+    """创建 points_checkpoints 表 - 积分余额检查点"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS points_checkpoints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity_id TEXT NOT NULL,
+            action_id INTEGER NOT NULL,     -- 已计入余额的最后一条 user_actions.id
+            balance INTEGER NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            
+            UNIQUE (entity_id, action_id)
+        )
+    ''')
+    print("✅ Created points_checkpoints table")
+
+def create_scheduled_runs_table(conn):
+    """创建 scheduled_runs 表 - 定时任务执行记录（同一任务每天只执行一次）"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS scheduled_runs (
+            job TEXT NOT NULL,
+            run_date TEXT NOT NULL,
+            started_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            finished_at TEXT,
+            duration_ms REAL,
+            result TEXT,
+            
+            PRIMARY KEY (job, run_date)
+        )
+    ''')
+    print("✅ Created scheduled_runs table")
+
+def create_quota_usage_table(conn):
+    """创建 quota_usage 表 - 配额计数（如每人每天发起问题数）"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quota_usage (
+            subject TEXT NOT NULL,          -- 配额主体（用户 ID）
+            scope TEXT NOT NULL,            -- 配额名
+            period TEXT NOT NULL,           -- 计数窗口（如 UTC 日期）
+            used INTEGER NOT NULL DEFAULT 0,
+            
+            PRIMARY KEY (subject, scope, period)
+        )
+    ''')
+    print("✅ Created quota_usage table")
+
 def create_oauth_tokens_table(conn):
     """创建 oauth_tokens 表 - OAuth 2.0 access_token（改进版 v2.0）"""
     conn.execute('''
@@ -323,6 +396,50 @@ def create_triggers(conn):
     except sqlite3.OperationalError:
         print("⚠️  Trigger already exists: update_skills_updated_at")
 
+# 全文索引：(内容表, FTS 表, 索引列)
+SEARCH_INDEXES = [
+    ('questions', 'questions_fts', ('title', 'description', 'requirements')),
+    ('activities', 'activities_fts', ('title', 'description', 'requirements')),
+    ('skills', 'skills_fts', ('name', 'description')),
+]
+
+def create_search_index(conn):
+    """
+    创建 FTS5 全文索引（外部内容表，不重复存储正文）及同步触发器
+    
+    使用 trigram 分词，中英文都能按子串检索（每个检索词至少 3 个字符）。
+    更新触发器只监听被索引的列，浏览数、热度等计数变化不会重建索引。
+    最后 rebuild 一次，把已有数据写入索引。
+    """
+    for table, fts, columns in SEARCH_INDEXES:
+        cols = ', '.join(columns)
+        new_values = ', '.join(f'new.{c}' for c in columns)
+        old_values = ', '.join(f'old.{c}' for c in columns)
+        conn.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                {cols},
+                content='{table}', content_rowid='id', tokenize='trigram'
+            )
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values});
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values});
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values});
+                INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values});
+            END
+        ''')
+        conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+        print(f"✅ Created search index: {fts}")
+
 def create_indexes(conn):
     """创建索引"""
     # users 表索引
@@ -331,6 +448,8 @@ def create_indexes(conn):
     conn.execute('CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)')
     conn.execute('CREATE INDEX IF NOT EXISTS idx_users_score ON users(score DESC)')
     conn.execute('CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at DESC)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_created_at_id ON users(created_at DESC, id DESC)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_updated_at ON users(updated_at)')
     print("✅ Created indexes for users table")
     
     # questions 表索引
@@ -339,18 +458,31 @@ def create_indexes(conn):
     conn.execute('CREATE INDEX IF NOT EXISTS idx_questions_created_at ON questions(created_at DESC)')
     conn.execute('CREATE INDEX IF NOT EXISTS idx_questions_created_by_id ON questions(created_by_id)')
     conn.execute('CREATE INDEX IF NOT EXISTS idx_questions_status_created_at ON questions(status, created_at DESC)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_questions_heat_created_at ON questions(heat DESC, created_at DESC, id DESC)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_questions_status_heat ON questions(status, heat DESC, created_at DESC, id DESC)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_questions_updated_at ON questions(updated_at)')
     print("✅ Created indexes for questions table")
     
     # activities 表索引
     conn.execute('CREATE INDEX IF NOT EXISTS idx_activities_question_id ON activities(question_id)')
     conn.execute('CREATE INDEX IF NOT EXISTS idx_activities_created_at ON activities(created_at DESC)')
     conn.execute('CREATE INDEX IF NOT EXISTS idx_activities_status ON activities(status)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_activities_created_at_id ON activities(created_at DESC, id DESC)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_activities_status_created_at ON activities(status, created_at DESC, id DESC)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_activities_updated_at ON activities(updated_at)')
     print("✅ Created indexes for activities table")
     
+    # participants 表索引（主键已覆盖按活动查询）
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_participants_entity_id ON participants(entity_id, joined_at DESC)')
+    print("✅ Created indexes for participants table")
+    
     # submissions 表索引
     conn.execute('CREATE INDEX IF NOT EXISTS idx_submissions_activity_id ON submissions(activity_id)')
     conn.execute('CREATE INDEX IF NOT EXISTS idx_submissions_submitter_id ON submissions(submitter_id)')
     conn.execute('CREATE INDEX IF NOT EXISTS idx_submissions_submitted_at ON submissions(submitted_at DESC)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_submissions_activity_submitter ON submissions(activity_id, submitter_id)')
+    # 排名：按票数取前几名、定位并列组
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_submissions_activity_votes ON submissions(activity_id, vote_count DESC, id)')
     print("✅ Created indexes for submissions table")
     
     # submission_votes 表索引（新增 v2.0）
@@ -369,6 +501,11 @@ def create_indexes(conn):
     conn.execute('CREATE INDEX IF NOT EXISTS idx_skills_downloads ON skills(downloads DESC)')
     conn.execute('CREATE INDEX IF NOT EXISTS idx_skills_rating ON skills(rating DESC)')
     conn.execute('CREATE INDEX IF NOT EXISTS idx_skills_created_at ON skills(created_at DESC)')
+    # 市场排序（rank_score, downloads, id）
+    conn.execute('DROP INDEX IF EXISTS idx_skills_rating_downloads')
+    conn.execute('DROP INDEX IF EXISTS idx_skills_category_rating')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_skills_rank ON skills(rank_score DESC, downloads DESC, id DESC)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_skills_category_rank ON skills(category, rank_score DESC, downloads DESC, id DESC)')
     print("✅ Created indexes for skills table")
     
     # skill_downloads 表索引
@@ -377,7 +514,8 @@ def create_indexes(conn):
     print("✅ Created indexes for skill_downloads table")
     
     # skill_ratings 表索引
-    conn.execute('CREATE INDEX IF NOT EXISTS idx_skill_ratings_skill_id ON skill_ratings(skill_id)')
+    # 旧库的 skill_ratings 没有 UNIQUE 约束，用唯一索引保证每人每个技能一条评分
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_skill_ratings_skill_rater ON skill_ratings(skill_id, rater_id)')
     conn.execute('CREATE INDEX IF NOT EXISTS idx_skill_ratings_rater_id ON skill_ratings(rater_id)')
     print("✅ Created indexes for skill_ratings table")
     
@@ -386,6 +524,9 @@ def create_indexes(conn):
     conn.execute('CREATE INDEX IF NOT EXISTS idx_user_actions_action_type ON user_actions(action_type)')
     conn.execute('CREATE INDEX IF NOT EXISTS idx_user_actions_entity_action ON user_actions(entity_id, action_type, created_at DESC)')
     conn.execute('CREATE INDEX IF NOT EXISTS idx_user_actions_created_at ON user_actions(created_at DESC)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_actions_entity_created ON user_actions(entity_id, created_at DESC, id DESC)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_actions_entity_action_id ON user_actions(entity_id, action_type, created_at DESC, id DESC)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_actions_entity_id_id ON user_actions(entity_id, id)')
     print("✅ Created indexes for user_actions table")
     
     # oauth_tokens 表索引（改进版 v2.0）
@@ -396,6 +537,113 @@ def create_indexes(conn):
     conn.execute('CREATE INDEX IF NOT EXISTS idx_oauth_tokens_revoked ON oauth_tokens(revoked)')
     print("✅ Created indexes for oauth_tokens table (v2.0)")
 
+def refresh_participant_counts(conn):
+    """
+    按 participants 表回填活动参与人数，并把 questions.participants 统一为整数
+    
+    旧数据的 questions.participants 可能是 JSON 数组（取其长度）；
+    之后两者都由后端在加入活动时增量维护。
+    """
+    conn.execute('''
+        UPDATE activities SET participants_count = (
+            SELECT COUNT(*) FROM participants p WHERE p.activity_id = activities.id
+        )
+    ''')
+    conn.execute('''
+        UPDATE questions SET participants =
+            CASE
+                WHEN json_valid(participants) AND json_type(participants) = 'array'
+                    THEN json_array_length(participants)
+                ELSE 0
+            END
+        WHERE typeof(participants) != 'integer'
+    ''')
+    print("✅ Refreshed participant counts")
+
+def refresh_submission_ranks(conn):
+    """
+    按 submission_votes 重新统计提交票数，并计算每个活动内的名次（并列排名）
+    
+    之后票数和名次由后端在每次投票时增量维护，这里用于回填旧数据。
+    """
+    conn.execute('''
+        UPDATE submissions SET vote_count = (
+            SELECT COUNT(*) FROM submission_votes v WHERE v.submission_id = submissions.id
+        )
+    ''')
+    conn.execute('''
+        UPDATE submissions SET rank = r.rank
+        FROM (
+            SELECT id, RANK() OVER (PARTITION BY activity_id ORDER BY vote_count DESC) AS rank
+            FROM submissions
+        ) AS r
+        WHERE r.id = submissions.id
+    ''')
+    print("✅ Refreshed submission ranks")
+
+def refresh_question_heat(conn):
+    """
+    重新计算 questions.heat（热度 = 浏览数 × 1 + 投票数 × 5 + 参与数 × 10）
+    
+    之后 heat 由后端在浏览/投票/参与变化时增量维护，这里用于回填旧数据。
+    """
+    conn.execute('''
+        UPDATE questions SET heat =
+            COALESCE(views, 0) * 1
+            + COALESCE(votes, 0) * 5
+            + COALESCE(participants, 0) * 10
+    ''')
+    print("✅ Refreshed question heat")
+
+def refresh_skill_ratings(conn):
+    """
+    按 skill_ratings 重新计算技能的平均分、评分数和排序分
+    
+    之后由后端在每次评分时增量维护，这里用于回填旧数据。
+    排序分 = (先验平均分 × 先验评分数 + 评分总和) / (先验评分数 + 评分数)，
+    先验与 backend/config.py 的 SKILL_RATING_PRIOR_* 一致。
+    """
+    conn.execute('''
+        UPDATE skills SET
+            rating = COALESCE(r.total * 1.0 / r.n, 0.0),
+            rating_count = r.n,
+            rank_score = (3.0 * 5 + COALESCE(r.total, 0)) / (5 + r.n)
+        FROM (
+            SELECT s.id AS skill_id, SUM(sr.rating) AS total, COUNT(sr.id) AS n
+            FROM skills s LEFT JOIN skill_ratings sr ON sr.skill_id = s.id
+            GROUP BY s.id
+        ) AS r
+        WHERE r.skill_id = skills.id
+    ''')
+    print("✅ Refreshed skill ratings")
+
+def checkpoint_points_balances(conn):
+    """
+    为还没有积分检查点的用户写入起点检查点（当前积分，截至已有的最后一条操作日志）
+    
+    积分账本之前的积分没有逐笔记录，以当前积分为起点，之后的变动由账本累加。
+    """
+    conn.execute('''
+        INSERT INTO points_checkpoints (entity_id, action_id, balance)
+        SELECT u.user_id,
+               COALESCE((SELECT MAX(a.id) FROM user_actions a WHERE a.entity_id = u.user_id), 0),
+               COALESCE(u.score, 0)
+        FROM users u
+        WHERE NOT EXISTS (SELECT 1 FROM points_checkpoints c WHERE c.entity_id = u.user_id)
+    ''')
+    print("✅ Checkpointed points balances")
+
+def backfill_question_quota(conn):
+    """按今天已发起的问题回填每日问题配额（范围条件，可走 created_at 索引）"""
+    conn.execute('''
+        INSERT OR IGNORE INTO quota_usage (subject, scope, period, used)
+        SELECT created_by_id, 'questions_per_day', DATE('now'), COUNT(*)
+        FROM questions
+        WHERE created_at >= DATE('now')
+        GROUP BY created_by_id
+    ''')
+    print("✅ Backfilled daily question quota")
+
 def insert_sample_data(conn):
     """插入示例数据"""
     # 插入示例用户
@@ -446,6 +694,7 @@ def init_database():
         create_users_table(conn)
         create_questions_table(conn)
         create_activities_table(conn)
+        create_participants_table(conn)
         create_submissions_table(conn)
         create_votes_table(conn)
         create_skills_table(conn)
@@ -453,6 +702,9 @@ def init_database():
         create_skill_ratings_table(conn)
         create_user_actions_table(conn)
         create_oauth_tokens_table(conn)
+        create_points_checkpoints_table(conn)
+        create_scheduled_runs_table(conn)
+        create_quota_usage_table(conn)
         
         # 创建 submission_votes 表（v2.0 新增）
         create_submission_votes_table(conn)
@@ -469,11 +721,46 @@ def init_database():
         create_indexes(conn)
         print()
         
+        # 创建全文索引
+        print("🔎 Creating search index...")
+        create_search_index(conn)
+        print()
+        
+        # 回填参与人数（热度依赖问题的参与数）
+        print("👥 Refreshing participant counts...")
+        refresh_participant_counts(conn)
+        print()
+        
+        # 回填提交名次
+        print("🥇 Refreshing submission ranks...")
+        refresh_submission_ranks(conn)
+        print()
+        
+        # 回填热度
+        print("🔥 Refreshing question heat...")
+        refresh_question_heat(conn)
+        print()
+        
+        # 回填技能评分
+        print("⭐ Refreshing skill ratings...")
+        refresh_skill_ratings(conn)
+        print()
+        
         # 插入示例数据
         print("📝 Inserting sample data...")
         insert_sample_data(conn)
         print()
         
+        # 回填今天的问题配额
+        print("🎫 Backfilling question quota...")
+        backfill_question_quota(conn)
+        print()
+        
+        # 积分账本起点
+        print("💰 Checkpointing points balances...")
+        checkpoint_points_balances(conn)
+        print()
+        
         # 提交更改
         conn.commit()
         print("✅ Database initialized successfully (v2.0)!")